@@ -0,0 +1,214 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import date, datetime
+from flask import Response, request
+from werkzeug.exceptions import NotFound
+from models import app, db, Venue, Artist, Shows
+from pagination import page_query, make_page
+from queries import (venue_detail, artist_detail, listing_filters, filter_listing,
+                     calendar_window, calendar_day_counts_query,
+                     calendar_shows_query, show_calendar)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+
+def _default(value):
+    # Only called for types json does not handle natively
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def json_response(data, status=200):
+    '''Serialize data with orjson when installed, else with json.'''
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, default=_default, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+
+def json_error(message, status):
+    return json_response({"error": message}, status)
+
+#----------------------------------------------------------------------------#
+# Fields.
+#----------------------------------------------------------------------------#
+
+# Columns that ?fields= can select, by field name
+VENUE_FIELDS = {
+    "id": Venue.id,
+    "name": Venue.name,
+    "genres": Venue.genres,
+    "address": Venue.address,
+    "city": Venue.city,
+    "state": Venue.state,
+    "phone": Venue.phone,
+    "website": Venue.website,
+    "facebook_link": Venue.facebook_link,
+    "seeking_talent": Venue.seeking_talent,
+    "seeking_description": Venue.seeking_description,
+    "image_link": Venue.image_link,
+    "num_upcoming_shows": Venue.upcoming_shows_count,
+    "next_show_time": Venue.next_show_time,
+}
+
+ARTIST_FIELDS = {
+    "id": Artist.id,
+    "name": Artist.name,
+    "genres": Artist.genres,
+    "city": Artist.city,
+    "state": Artist.state,
+    "phone": Artist.phone,
+    "website": Artist.website,
+    "facebook_link": Artist.facebook_link,
+    "seeking_venue": Artist.seeking_venue,
+    "seeking_description": Artist.seeking_description,
+    "image_link": Artist.image_link,
+    "num_upcoming_shows": Artist.upcoming_shows_count,
+    "next_show_time": Artist.next_show_time,
+}
+
+SHOW_FIELDS = {
+    "id": Shows.id,
+    "venue_id": Shows.venue_id,
+    "venue_name": Venue.name,
+    "artist_id": Shows.artist_id,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link,
+    "start_time": Shows.start_time,
+}
+
+# Fields of the detail endpoints that come from the shows of the entity
+DETAIL_SHOW_FIELDS = ("past_shows", "upcoming_shows",
+                      "past_shows_count", "upcoming_shows_count")
+
+
+def requested_fields(available):
+    '''Return the ?fields= names (all by default), None if one is unknown.'''
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if not fields or any(field not in available for field in fields):
+        return None
+    return fields
+
+
+def _page(query, fields, *sort_columns):
+    try:
+        query, window = page_query(query, *sort_columns)
+    except ValueError as error:
+        return json_error(str(error), 400)
+    page = make_page(query.all(), window)
+    return json_response({
+        "data": [{field: getattr(row, field) for field in fields}
+                 for row in page.items],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    })
+
+
+def _columns(available, fields, *sort_columns):
+    # Select the requested columns plus the sort key for the page cursors
+    columns = [available[field].label(field) for field in fields]
+    columns += [column for column in sort_columns if column.key not in fields]
+    return columns
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+
+@app.route('/api/v1/venues')
+def api_venues():
+    fields = requested_fields(VENUE_FIELDS)
+    if fields is None:
+        return json_error('Unknown field requested', 400)
+    sort_columns = (Venue.name, Venue.id)
+    query = filter_listing(db.session.query(*_columns(VENUE_FIELDS, fields, *sort_columns)),
+                           Venue, listing_filters())
+    return _page(query, fields, *sort_columns)
+
+
+@app.route('/api/v1/artists')
+def api_artists():
+    fields = requested_fields(ARTIST_FIELDS)
+    if fields is None:
+        return json_error('Unknown field requested', 400)
+    sort_columns = (Artist.name, Artist.id)
+    query = filter_listing(db.session.query(*_columns(ARTIST_FIELDS, fields, *sort_columns)),
+                           Artist, listing_filters())
+    return _page(query, fields, *sort_columns)
+
+
+@app.route('/api/v1/shows')
+def api_shows():
+    fields = requested_fields(SHOW_FIELDS)
+    if fields is None:
+        return json_error('Unknown field requested', 400)
+    sort_columns = (Shows.start_time, Shows.id)
+    query = db.session.query(*_columns(SHOW_FIELDS, fields, *sort_columns)
+                             ).select_from(Shows
+                                           ).filter(Shows.start_time > datetime.now())
+    # Only join the tables the requested fields come from
+    if 'venue_name' in fields:
+        query = query.join(Venue, Shows.venue_id == Venue.id)
+    if {'artist_name', 'artist_image_link'} & set(fields):
+        query = query.join(Artist, Shows.artist_id == Artist.id)
+    return _page(query, fields, *sort_columns)
+
+
+@app.route('/api/v1/shows/calendar')
+def api_show_calendar():
+    # Same window arguments as /shows?from=&to=, which are required here
+    try:
+        window = calendar_window()
+    except ValueError as error:
+        return json_error(str(error), 400)
+    if window is None:
+        return json_error('from or to is required', 400)
+    days = show_calendar(window, calendar_day_counts_query(window),
+                         calendar_shows_query(window))
+    return json_response({"from": window["from"], "to": window["to"],
+                          "days": days})
+
+
+def _detail(model, available, detail, id):
+    fields = requested_fields(list(available) + list(DETAIL_SHOW_FIELDS))
+    if fields is None:
+        return json_error('Unknown field requested', 400)
+    if not set(DETAIL_SHOW_FIELDS) & set(fields):
+        # No show data asked for, select the requested columns only
+        row = db.session.query(*[available[field].label(field) for field in fields]
+                               ).filter(model.id == id).first()
+        if row is None:
+            return json_error('Not found', 404)
+        return json_response({field: getattr(row, field) for field in fields})
+    try:
+        data, next_show_time = detail(id, request.args.get('upcoming') == 'all')
+    except NotFound:
+        return json_error('Not found', 404)
+    data.update(num_upcoming_shows=data['upcoming_shows_count'],
+                next_show_time=next_show_time)
+    return json_response({field: data[field] for field in fields})
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+    return _detail(Venue, VENUE_FIELDS, venue_detail, venue_id)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+    return _detail(Artist, ARTIST_FIELDS, artist_detail, artist_id)
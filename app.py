@@ -3,18 +3,103 @@
 #----------------------------------------------------------------------------#
 
 import json
+from contextlib import contextmanager
 from flask import (render_template, request,
-                   Response, flash, redirect, url_for, jsonify, abort)
+                   Response, flash, redirect, url_for, jsonify, abort,
+                   stream_with_context)
+from markupsafe import Markup
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from datetime import datetime
-from sqlalchemy import func, sql
-from models import app, db, Venue, Artist, Shows
+from datetime import datetime, timedelta
+from sqlalchemy import sql
+from models import (app, db, Venue, Artist, Shows, refresh_show_counters,
+                    lock_venue_bookings, venue_conflicts, lineup_conflicts,
+                    is_booking_conflict)
+from pagination import paginate
+from routing import replica_reads, reads_replica
+from pool import pool_stats
+from cache import (LRUCache, FragmentCache, create_backend, on_change,
+                   mark_changed)
+from queries import (listing_filters, facet_query, facet_links,
+                     venue_listing_query, VENUE_LISTING_ORDER, venue_areas,
+                     artist_listing_query, ARTIST_LISTING_ORDER, artist_listing,
+                     search_query, search_results, venue_detail, artist_detail,
+                     upcoming_shows_query, show_listing, calendar_window,
+                     calendar_day_counts_query, calendar_shows_query,
+                     show_calendar, calendar_links)
+import commands  # registers the flask CLI commands
+import api  # registers the JSON API routes
+import metrics  # records request metrics, serves /metrics
+import querycheck  # warns about N+1 queries in development
 import sys
 
 
+#----------------------------------------------------------------------------#
+# Caches.
+#----------------------------------------------------------------------------#
+
+# Search results per (entity, normalized term). The cache lives in each
+# worker process; commits through this process invalidate it right away,
+# writes seen only by other workers expire after SEARCH_CACHE_TIMEOUT.
+search_cache = LRUCache(app.config['SEARCH_CACHE_SIZE'],
+                        app.config['SEARCH_CACHE_TIMEOUT'])
+
+
+@on_change
+def invalidate_search_cache(changed):
+    # A show change is reported for both its venue and its artist
+    changed_models = {model for model, _ in changed}
+    search_cache.delete_matching(lambda key: key[0] in changed_models)
+
+
+# Rendered venue and artist details, keyed by id and data version
+fragment_cache = FragmentCache(create_backend(app.config))
+
+
+@on_change
+def invalidate_fragment_cache(changed):
+    for model, id in changed:
+        fragment_cache.invalidate(model, id)
+
+
+@contextmanager
+def caches_disabled():
+    '''Run requests without the search and fragment caches, so each of
+    them does all of its queries (e.g. to benchmark or EXPLAIN them).'''
+    saved = search_cache.maxsize, fragment_cache.backend
+    # A cache of size 0 drops every value as soon as it is stored
+    search_cache.clear()
+    search_cache.maxsize = 0
+    fragment_cache.backend = LRUCache(0)
+    try:
+        yield
+    finally:
+        search_cache.maxsize, fragment_cache.backend = saved
+
+
+def fragment_timeout(next_show_time):
+    # Drop the fragment when its next show starts and becomes a past show
+    timeout = app.config['FRAGMENT_CACHE_TIMEOUT']
+    if next_show_time is not None:
+        timeout = min(timeout, (next_show_time - datetime.now()).total_seconds())
+    return max(timeout, 0)
+
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+
+def stream_template(template_name, **context):
+    # Render the template lazily, in chunks of STREAM_BUFFER_SIZE pieces
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return stream
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -33,140 +118,58 @@ def venues():
     # Done: replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-    # Grapping each city state compination from venue table
-    city_states = db.session.query(
-        Venue.city,
-        Venue.state
-    ).group_by(Venue.city, Venue.state
-               ).all()
-
-    # Subquery to get upcoming shows
-    # and dummy column to help count the number of shows for each venue
-    sub_query = db.session.query(
-        Shows.venue_id,
-        sql.expression.bindparam("one", 1)
-    ).filter(Shows.start_time > datetime.now()).subquery()
-
-    # Get venues data and number of shows
-    venues = db.session.query(
-        Venue.id,
-        Venue.name,
-        Venue.city,
-        Venue.state,
-        func.sum(sub_query.c.one).label('shows')
-    ).outerjoin(sub_query, sub_query.c.venue_id == Venue.id
-                ).group_by(Venue.id, Venue.name, Venue.city, Venue.state
-                           ).all()
-    # print(venues)
+    # Get one page of the filtered venues and number of shows, ordered by
+    # area, and the facet counts of the filtered venues
+    filters = listing_filters()
+    page = paginate(venue_listing_query(filters), *VENUE_LISTING_ORDER)
+    facets = facet_links(facet_query(Venue, filters).all(), filters)
 
     # Prepare the data object with the same structure
-    data = [{"city": city,
-             "state": state,
-             "venues": [{
-                 "id": venue.id,
-                 "name": venue.name,
-                 "num_upcoming_shows": 0 if venue.shows is None else venue.shows
-             } for venue in venues if (venue.city == city and venue.state == state)]} for city, state in city_states]
-    # print(data)
+    data = venue_areas(page.items)
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data, page=page, facets=facets)
 
 
 @app.route('/venues/search', methods=['POST'])
+@replica_reads
 def search_venues():
     # Done: implement search on venues with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    search_term = request.form.get('search_term', '')
-    # Subquery to get upcoming shows
-    # and dummy column to help count the number of shows for each venue
-    sub_query = db.session.query(
-        Shows.venue_id,
-        sql.expression.bindparam("one", 1)
-    ).filter(Shows.start_time > datetime.now()).subquery()
-
-    # Get venues data and number of shows
-    venues = db.session.query(
-        Venue.id,
-        Venue.name,
-        func.sum(sub_query.c.one).label('shows')
-    ).outerjoin(sub_query, sub_query.c.venue_id == Venue.id
-                ).group_by(Venue.id, Venue.name
-                           ).having(Venue.name.ilike(f'%{search_term}%')).all()
-    print(venues)
-    # venues = db.session.query(Venue).filter(Venue.name.ilike(f'%{search_term}%')).all()
-    # print(venues)
-    response = {
-        "count": len(venues),
-        "data": [{
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": 0 if venue.shows is None else venue.shows
-        } for venue in venues]
-    }
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+    search_term = request.form.get('search_term', '').strip()
+    # Serve repeated searches from the cache, keyed on the normalized term
+    cache_key = ('Venue', search_term.lower())
+    response = search_cache.get(cache_key)
+    if response is None:
+        # Get venues data and number of shows, filtering on the name
+        response = search_results(search_query(Venue, search_term).all())
+        if not reads_replica():
+            search_cache.set(cache_key, response)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # Done: replace with real venue data from the venues table, using venue_id
-
-    # Get venue by venue_id
-    venue = Venue.query.get(venue_id)
-
-    # Get the past shows for this venue
-    past_shows = db.session.query(
-        Shows.artist_id,
-        Artist.name,
-        Artist.image_link,
-        Shows.start_time
-    ).join(Shows, Shows.artist_id == Artist.id
-           ).filter(Shows.start_time < datetime.now(), Shows.venue_id == venue_id
-                    ).all()
-
-    # Get the upcoming shows for this venue
-    upcoming_shows = db.session.query(
-        Shows.artist_id,
-        Artist.name,
-        Artist.image_link,
-        Shows.start_time
-    ).join(Shows, Shows.artist_id == Artist.id
-           ).filter(Shows.start_time > datetime.now(), Shows.venue_id == venue_id
-                    ).all()
-
-    # Prepare the data object
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres,
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": [{
-            "artist_id": show.artist_id,
-            "artist_name": show.name,
-            "artist_image_link": show.image_link,
-            "start_time": str(show.start_time)
-        } for show in past_shows],
-        "upcoming_shows": [{
-            "artist_id": show.artist_id,
-            "artist_name": show.name,
-            "artist_image_link": show.image_link,
-            "start_time": str(show.start_time)
-        } for show in upcoming_shows],
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-
-    return render_template('pages/show_venue.html', venue=data)
+    show_all = request.args.get('upcoming') == 'all'
+
+    # Serve the rendered venue detail from the fragment cache when possible
+    cache_key = fragment_cache.key('Venue', venue_id, show_all)
+    fragment = fragment_cache.get(cache_key)
+    if fragment is None:
+        data, next_show_time = venue_detail(venue_id, show_all)
+        fragment = {
+            "name": data["name"],
+            "detail": render_template('pages/_venue_detail.html', venue=data)
+        }
+        if not reads_replica():
+            fragment_cache.set(cache_key, fragment,
+                               fragment_timeout(next_show_time))
+
+    return render_template('pages/show_venue.html', name=fragment["name"],
+                           detail=Markup(fragment["detail"]))
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -234,107 +237,52 @@ def delete_venue(venue_id):
 @app.route('/artists')
 def artists():
     # Done: replace with real data returned from querying the database
-    artists = db.session.query(
-        Artist.id,
-        Artist.name
-    ).all()
-    data = [{
-        "id": artist.id,
-        "name": artist.name
-    } for artist in artists]
-    return render_template('pages/artists.html', artists=data)
+    filters = listing_filters()
+    page = paginate(artist_listing_query(filters), *ARTIST_LISTING_ORDER)
+    facets = facet_links(facet_query(Artist, filters).all(), filters)
+    data = artist_listing(page.items)
+    return render_template('pages/artists.html', artists=data, page=page, facets=facets)
 
 
 @app.route('/artists/search', methods=['POST'])
+@replica_reads
 def search_artists():
     # Done: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search_term = request.form.get('search_term', '')
-    # Subquery to get upcoming shows
-    # and dummy column to help count the number of shows for each venue
-    sub_query = db.session.query(
-        Shows.artist_id,
-        sql.expression.bindparam("one", 1)
-    ).filter(Shows.start_time > datetime.now()).subquery()
-
-    # Get venues data and number of shows
-    artists = db.session.query(
-        Artist.id,
-        Artist.name,
-        func.sum(sub_query.c.one).label('shows')
-    ).outerjoin(sub_query, sub_query.c.artist_id == Artist.id
-                ).group_by(Artist.id, Artist.name
-                           ).having(Artist.name.ilike(f'%{search_term}%')).all()
-    print(venues)
-    # venues = db.session.query(Venue).filter(Venue.name.ilike(f'%{search_term}%')).all()
-    # print(venues)
-    response = {
-        "count": len(artists),
-        "data": [{
-            "id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": 0 if artist.shows is None else artist.shows
-        } for artist in artists]
-    }
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    search_term = request.form.get('search_term', '').strip()
+    # Serve repeated searches from the cache, keyed on the normalized term
+    cache_key = ('Artist', search_term.lower())
+    response = search_cache.get(cache_key)
+    if response is None:
+        # Get artists data and number of shows, filtering on the name
+        response = search_results(search_query(Artist, search_term).all())
+        if not reads_replica():
+            search_cache.set(cache_key, response)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # Done: replace with real venue data from the venues table, using venue_id
-    # Get the artist data by artist_id
-    artist = Artist.query.get(artist_id)
-    # Get the past shows for this venue
-    past_shows = db.session.query(
-        Shows.venue_id,
-        Venue.name,
-        Venue.image_link,
-        Shows.start_time
-    ).join(Shows, Shows.venue_id == Venue.id
-           ).filter(Shows.start_time < datetime.now(), Shows.artist_id == artist_id
-                    ).all()
-
-    # Get the upcoming shows for this venue
-    upcoming_shows = db.session.query(
-        Shows.venue_id,
-        Venue.name,
-        Venue.image_link,
-        Shows.start_time
-    ).join(Shows, Shows.venue_id == Venue.id
-           ).filter(Shows.start_time > datetime.now(), Shows.artist_id == artist_id
-                    ).all()
-
-    # Prepare the data object
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres,
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": [{
-            "venue_id": show.venue_id,
-            "venue_name": show.name,
-            "venue_image_link": show.image_link,
-            "start_time": str(show.start_time)
-        } for show in past_shows],
-        "upcoming_shows": [{
-            "venue_id": show.venue_id,
-            "venue_name": show.name,
-            "venue_image_link": show.image_link,
-            "start_time": str(show.start_time)
-        } for show in upcoming_shows],
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-    return render_template('pages/show_artist.html', artist=data)
+    show_all = request.args.get('upcoming') == 'all'
+
+    # Serve the rendered artist detail from the fragment cache when possible
+    cache_key = fragment_cache.key('Artist', artist_id, show_all)
+    fragment = fragment_cache.get(cache_key)
+    if fragment is None:
+        data, next_show_time = artist_detail(artist_id, show_all)
+        fragment = {
+            "name": data["name"],
+            "detail": render_template('pages/_artist_detail.html', artist=data)
+        }
+        if not reads_replica():
+            fragment_cache.set(cache_key, fragment,
+                               fragment_timeout(next_show_time))
+
+    return render_template('pages/show_artist.html', name=fragment["name"],
+                           detail=Markup(fragment["detail"]))
 
 
 @app.route('/artist/<artist_id>', methods=['DELETE'])
@@ -521,26 +469,30 @@ def shows():
     # displays list of shows at /shows
     # Done: replace with real venues data.
     #       num_shows should be aggregated based on number of upcoming shows per venue.
-    shows = db.session.query(
-        Shows.venue_id,
-        Venue.name.label('venue_name'),
-        Artist.id,
-        Artist.name.label('artist_name'),
-        Artist.image_link,
-        Shows.start_time
-    ).join(Shows, Shows.venue_id == Venue.id
-           ).join(Artist, Shows.artist_id == Artist.id
-                  ).filter(Shows.start_time > datetime.now()
-                           ).all()
-    data = [{
-        "venue_id": show.venue_id,
-        "venue_name": show.venue_name,
-        "artist_id": show.id,
-        "artist_name": show.artist_name,
-        "artist_image_link": show.image_link,
-        "start_time": str(show.start_time)
-    } for show in shows]
-    return render_template('pages/shows.html', shows=data)
+    # ?from=&to= (and optionally &venue=, &artist=) list the shows of a
+    # window of dates, past or upcoming, day by day
+    try:
+        calendar = calendar_window()
+    except ValueError as error:
+        abort(400, str(error))
+    if calendar is not None:
+        return render_template(
+            'pages/calendar.html', window=calendar, links=calendar_links(calendar),
+            days=show_calendar(calendar, calendar_day_counts_query(calendar),
+                               calendar_shows_query(calendar)))
+
+    query = upcoming_shows_query()
+
+    # ?stream=1 lists every upcoming show, reading them from a server
+    # side cursor and sending the page while it is being rendered
+    if request.args.get('stream'):
+        shows = query.order_by(Shows.start_time, Shows.id).yield_per(
+            app.config['STREAM_BATCH_SIZE'])
+        return Response(stream_with_context(stream_template(
+            'pages/shows.html', shows=show_listing(shows), page=None)))
+
+    page = paginate(query, Shows.start_time, Shows.id)
+    return render_template('pages/shows.html', shows=list(show_listing(page.items)), page=page)
 
 
 @app.route('/shows/create')
@@ -554,16 +506,37 @@ def create_shows():
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # Done: insert form data as a new Show record in the db, instead
+    form = ShowForm(request.form)
+    # Every field the conflict check uses; a missing start time would
+    # make it look for shows overlapping an unbounded period
+    fields = (form.artist_id, form.venue_id, form.start_time, form.duration)
+    if not all([field.validate(form) for field in fields]):
+        for field in fields:
+            for error in field.errors:
+                flash(error)
+        return render_template('forms/new_show.html', form=form)
     try:
-        form = ShowForm(request.form)
         show = Shows()
         form.populate_obj(show)
+        # The venue's exclusion constraint index finds a clashing show
+        # without scanning its other bookings
+        lock_venue_bookings([show.venue_id])
+        conflict = venue_conflicts(show.venue_id, show.start_time,
+                                   show.duration).first()
+        if conflict is not None:
+            flash(booking_conflict(conflict) + ' Show could not be listed.')
+            return render_template('forms/new_show.html', form=form)
         db.session.add(show)
         db.session.commit()
         # on successful db insert, flash success
         flash('Show was successfully listed!')
-    except Exception:
+    except Exception as error:
         db.session.rollback()
+        if is_booking_conflict(error):
+            # Booked concurrently, after the check above
+            flash('Venue ' + str(show.venue_id) +
+                  ' was booked at that time meanwhile. Show could not be listed.')
+            return render_template('forms/new_show.html', form=form)
         # Done: on unsuccessful db insert, flash an error instead.
         # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
         # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
@@ -574,6 +547,93 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+def booking_conflict(show):
+    end_time = show.start_time + timedelta(minutes=show.duration)
+    return (f'Venue {show.venue_id} is already booked from '
+            f'{show.start_time:%Y-%m-%d %H:%M} to {end_time:%Y-%m-%d %H:%M} '
+            f'(show {show.id}).')
+
+
+@app.route('/shows/create/batch')
+def create_show_batch():
+    form = ShowBatchForm()
+    return render_template('forms/new_show_batch.html', form=form)
+
+
+@app.route('/shows/create/batch', methods=['POST'])
+def create_show_batch_submission():
+    # called to create a whole lineup of shows in one transaction
+    form = ShowBatchForm(request.form)
+    if not form.validate():
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error)
+        return render_template('forms/new_show_batch.html', form=form)
+    if len(form.shows) > app.config['SHOW_BATCH_MAX']:
+        flash(f"A lineup can hold at most {app.config['SHOW_BATCH_MAX']} shows.")
+        return render_template('forms/new_show_batch.html', form=form)
+
+    artist_ids = {show['artist_id'] for show in form.shows}
+    venue_ids = {show['venue_id'] for show in form.shows}
+    try:
+        # Check every referenced artist and venue with one query
+        found = db.session.query(
+            sql.literal('Artist'), Artist.id
+        ).filter(Artist.id.in_(artist_ids)).union_all(db.session.query(
+            sql.literal('Venue'), Venue.id
+        ).filter(Venue.id.in_(venue_ids))).all()
+        missing = [f'artist {id}' for id in sorted(artist_ids - {id for model, id in found if model == 'Artist'})] + \
+            [f'venue {id}' for id in sorted(venue_ids - {id for model, id in found if model == 'Venue'})]
+        if missing:
+            flash('Unknown ' + ', '.join(missing) + '. No show was listed.')
+            return render_template('forms/new_show_batch.html', form=form)
+        # Clashes within the lineup were rejected by the form; check it
+        # against the existing bookings with one query
+        lock_venue_bookings(venue_ids)
+        conflict = lineup_conflicts(form.shows).first()
+        if conflict is not None:
+            flash(booking_conflict(conflict) + ' No show was listed.')
+            return render_template('forms/new_show_batch.html', form=form)
+
+        # Insert the whole lineup with one multi-row INSERT. It skips the
+        # Shows mapper events, so refresh the counters and caches here.
+        db.session.execute(Shows.__table__.insert().values(form.shows))
+        connection = db.session.connection()
+        refresh_show_counters(connection, Venue, venue_ids)
+        refresh_show_counters(connection, Artist, artist_ids)
+        mark_changed(db.session, Venue, *venue_ids)
+        mark_changed(db.session, Artist, *artist_ids)
+        db.session.commit()
+        flash(f'{len(form.shows)} shows were successfully listed!')
+    except Exception as error:
+        db.session.rollback()
+        if is_booking_conflict(error):
+            flash('A venue of the lineup was booked meanwhile. No show was listed.')
+            return render_template('forms/new_show_batch.html', form=form)
+        flash('An error occurred. Shows could not be listed.')
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+    return render_template('pages/home.html')
+
+
+#  Stats
+#  ----------------------------------------------------------------
+
+@app.route('/stats/cache')
+def cache_stats():
+    return jsonify({'search': search_cache.stats(),
+                    'fragments': fragment_cache.stats()})
+
+
+@app.route('/stats/db')
+def db_stats():
+    # Connection pool usage of the primary and of each replica
+    binds = [None] + list(app.config['SQLALCHEMY_BINDS'])
+    return jsonify({bind or 'primary': pool_stats(db.get_engine(app, bind=bind))
+                    for bind in binds})
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
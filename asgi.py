@@ -0,0 +1,303 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import asyncio
+import io
+import re
+from urllib.parse import unquote
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, g, render_template, request, request_started
+from markupsafe import Markup
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Query, sessionmaker
+from models import Venue, Artist, Shows
+from app import app, search_cache, fragment_cache, fragment_timeout
+from pagination import page_query, make_page
+from queries import (listing_filters, facet_query, facet_links,
+                     venue_listing_query, VENUE_LISTING_ORDER, venue_areas,
+                     artist_listing_query, ARTIST_LISTING_ORDER, artist_listing,
+                     search_query, search_results, venue_detail_query,
+                     venue_detail_data, artist_detail_query, artist_detail_data,
+                     upcoming_shows_query, show_listing, calendar_window,
+                     calendar_day_counts_query, calendar_shows_query,
+                     show_calendar, calendar_links)
+from routing import reads_replica
+
+#----------------------------------------------------------------------------#
+# ASGI serving.
+#
+# Run with an ASGI server, e.g. `uvicorn asgi:application --workers 4`.
+# The listing, search and detail pages are served here on asyncpg, so a
+# worker keeps many of them waiting on PostgreSQL at once. They build
+# their queries and data with the same functions as the Flask views;
+# only the execution is awaited. Every other request goes to the Flask
+# app, which asgiref runs in a thread.
+#
+# Each request keeps its Flask request context across its awaits: the
+# context locals of Werkzeug 2 are context variables, so every request
+# sees its own from the asyncio task serving it.
+#----------------------------------------------------------------------------#
+
+
+def _async_url(uri):
+    return uri.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+
+def _engine(uri):
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    return create_async_engine(
+        uri,
+        pool_size=app.config['ASYNC_POOL_SIZE'],
+        max_overflow=options.get('max_overflow', 10),
+        pool_timeout=options.get('pool_timeout', 30),
+        pool_recycle=options.get('pool_recycle', -1),
+        pool_pre_ping=options.get('pool_pre_ping', False),
+        connect_args={'server_settings': {
+            'statement_timeout': str(app.config['DB_STATEMENT_TIMEOUT'])}})
+
+
+primary = _engine(app.config['SQLALCHEMY_ASYNC_DATABASE_URI'])
+# Named as the binds of the Flask views, see routing.py
+replicas = {f'replica_{number}': _engine(_async_url(uri)) for number, uri
+            in enumerate(app.config['SQLALCHEMY_REPLICA_URIS'])}
+sessions = {engine: sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            for engine in [primary, *replicas.values()]}
+
+
+async def fetch(statement):
+    '''Run an ORM query or select() on asyncpg and return its rows.'''
+    # The replica picked by route_to_replica, as in the Flask views
+    engine = replicas.get(g.get('db_bind'), primary)
+    async with sessions[engine]() as session:
+        if isinstance(statement, Query):
+            statement = statement.statement
+        result = await session.execute(statement)
+        return result.all()
+
+
+async def fragments(method, *args):
+    '''Call a fragment cache method, in a thread if its backend blocks.'''
+    if fragment_cache.backend.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+#----------------------------------------------------------------------------#
+# Requests and responses.
+#----------------------------------------------------------------------------#
+
+
+def _environ(scope, body):
+    '''Build the WSGI environ of an ASGI http scope.'''
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': unquote(scope['path']),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def dispatch(environ, view, arguments):
+    '''Handle a request with an async view and return the Flask response.
+
+    The same steps as Flask's wsgi_app: the before_request hooks (metrics,
+    query checks, replica routing) run first, errors go to the app's
+    error handlers, then the after_request and teardown hooks run.
+    '''
+    context = app.request_context(environ)
+    error = None
+    try:
+        context.push()
+        try:
+            app.try_trigger_before_first_request_functions()
+            request_started.send(app)
+            response = app.preprocess_request()
+            if response is None:
+                response = await view(*arguments)
+        except Exception as raised:
+            response = app.handle_user_exception(raised)
+        return app.finalize_request(response)
+    except Exception as raised:
+        error = raised
+        return app.handle_exception(raised)
+    finally:
+        context.auto_pop(error)
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+
+async def venues():
+    filters = listing_filters()
+    try:
+        query, window = page_query(venue_listing_query(filters), *VENUE_LISTING_ORDER)
+    except ValueError as error:
+        abort(400, str(error))
+    page = make_page(await fetch(query), window)
+    facet_rows = await fetch(facet_query(Venue, filters))
+    return render_template(
+        'pages/venues.html', areas=venue_areas(page.items), page=page,
+        facets=facet_links(facet_rows, filters))
+
+
+async def artists():
+    filters = listing_filters()
+    try:
+        query, window = page_query(artist_listing_query(filters), *ARTIST_LISTING_ORDER)
+    except ValueError as error:
+        abort(400, str(error))
+    page = make_page(await fetch(query), window)
+    facet_rows = await fetch(facet_query(Artist, filters))
+    return render_template(
+        'pages/artists.html', artists=artist_listing(page.items), page=page,
+        facets=facet_links(facet_rows, filters))
+
+
+async def shows():
+    try:
+        calendar = calendar_window()
+        query, window = page_query(upcoming_shows_query(), Shows.start_time, Shows.id)
+    except ValueError as error:
+        abort(400, str(error))
+    if calendar is not None:
+        return await show_calendar_page(calendar)
+    page = make_page(await fetch(query), window)
+    return render_template(
+        'pages/shows.html', shows=list(show_listing(page.items)), page=page)
+
+
+async def show_calendar_page(calendar):
+    day_counts = await fetch(calendar_day_counts_query(calendar))
+    rows = await fetch(calendar_shows_query(calendar))
+    return render_template(
+        'pages/calendar.html', window=calendar, links=calendar_links(calendar),
+        days=show_calendar(calendar, day_counts, rows))
+
+
+def search(model, template):
+    async def view():
+        search_term = request.form.get('search_term', '').strip()
+        cache_key = (model.__name__, search_term.lower())
+        response = search_cache.get(cache_key)
+        if response is None:
+            response = search_results(await fetch(search_query(model, search_term)))
+            # A lagging replica could refill the cache with stale rows
+            if not reads_replica():
+                search_cache.set(cache_key, response)
+        return render_template(template, results=response, search_term=search_term)
+    return view
+
+
+def detail(model, detail_query, detail_data, template, fragment_template):
+    async def view(id):
+        show_all = request.args.get('upcoming') == 'all'
+        cache_key = await fragments(fragment_cache.key, model.__name__, id, show_all)
+        fragment = await fragments(fragment_cache.get, cache_key)
+        if fragment is None:
+            data, next_show_time = detail_data(await fetch(detail_query(id, show_all)))
+            fragment = {
+                "name": data["name"],
+                "detail": render_template(fragment_template,
+                                          **{model.__name__.lower(): data})
+            }
+            if not reads_replica():
+                await fragments(fragment_cache.set, cache_key, fragment,
+                                fragment_timeout(next_show_time))
+        return render_template(template, name=fragment["name"],
+                               detail=Markup(fragment["detail"]))
+    return view
+
+
+# (method, path pattern, view); the path groups are passed to the view
+ROUTES = [
+    ('GET', re.compile(r'/venues'), venues),
+    ('GET', re.compile(r'/artists'), artists),
+    ('GET', re.compile(r'/shows'), shows),
+    ('POST', re.compile(r'/venues/search'),
+     search(Venue, 'pages/search_venues.html')),
+    ('POST', re.compile(r'/artists/search'),
+     search(Artist, 'pages/search_artists.html')),
+    ('GET', re.compile(r'/venues/(\d+)'),
+     detail(Venue, venue_detail_query, venue_detail_data,
+            'pages/show_venue.html', 'pages/_venue_detail.html')),
+    ('GET', re.compile(r'/artists/(\d+)'),
+     detail(Artist, artist_detail_query, artist_detail_data,
+            'pages/show_artist.html', 'pages/_artist_detail.html')),
+]
+
+
+def _route(scope):
+    if scope['method'] not in ('GET', 'POST'):
+        return None, ()
+    # The streamed listing stays on the Flask view and its server side cursor
+    if scope['path'] == '/shows' and b'stream=' in scope['query_string']:
+        return None, ()
+    for method, pattern, view in ROUTES:
+        match = pattern.fullmatch(scope['path'])
+        if match and method == scope['method']:
+            return view, [int(group) for group in match.groups()]
+    return None, ()
+
+#----------------------------------------------------------------------------#
+# Application.
+#----------------------------------------------------------------------------#
+
+wsgi_application = WsgiToAsgi(app)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in sessions:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    view, arguments = _route(scope) if scope['type'] == 'http' else (None, ())
+    if view is None:
+        return await wsgi_application(scope, receive, send)
+
+    environ = _environ(scope, await _read_body(receive))
+    response = await dispatch(environ, view, arguments)
+    body = response.get_data()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
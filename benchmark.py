@@ -0,0 +1,311 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import bisect
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from forms import GENERE_CHOICES, DEFAULT_SHOW_DURATION
+from importer import bulk_import
+from partitions import create_partitions
+from models import app, db, Venue, Artist, Shows
+
+#----------------------------------------------------------------------------#
+# Synthetic dataset.
+#----------------------------------------------------------------------------#
+
+# (city, state, weight): a few big cities get most of the venues
+CITIES = [
+    ('New York', 'NY', 30), ('Los Angeles', 'CA', 20), ('Chicago', 'IL', 12),
+    ('San Francisco', 'CA', 10), ('Austin', 'TX', 8), ('Seattle', 'WA', 6),
+    ('Nashville', 'TN', 6), ('New Orleans', 'LA', 4), ('Denver', 'CO', 3),
+    ('Portland', 'OR', 3), ('Boston', 'MA', 3), ('Miami', 'FL', 2),
+    ('Detroit', 'MI', 1), ('Memphis', 'TN', 1), ('Atlanta', 'GA', 1),
+]
+ADJECTIVES = ['Blue', 'Golden', 'Electric', 'Velvet', 'Wild', 'Silver', 'Midnight',
+              'Crimson', 'Lucky', 'Rusty', 'Neon', 'Little', 'Grand', 'Hidden']
+NOUNS = ['Hop', 'Lounge', 'Room', 'Hall', 'Garden', 'Cellar', 'Barn', 'Stage',
+         'Tavern', 'Theatre', 'Club', 'Loft', 'Saloon', 'Dock']
+BAND_NOUNS = ['Band', 'Trio', 'Collective', 'Orchestra', 'Quartet', 'Sound',
+              'Brothers', 'Sisters', 'Project', 'Ensemble', 'Kids', 'Machine']
+GENRES = [value for value, label in GENERE_CHOICES]
+
+
+def dataset_size(shows):
+    '''Number of venues and artists generated along with the shows.'''
+    return max(10, shows // 100), max(20, shows // 20)
+
+
+def _zipf_weights(count, exponent):
+    # Cumulative weights of a Zipf distribution: the rank 1 entity is the
+    # most popular, e.g. a handful of venues host thousands of shows
+    total, weights = 0.0, []
+    for rank in range(1, count + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def _pick(rng, ids, cum_weights):
+    return ids[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def _name(rng, nouns, number):
+    return f'The {rng.choice(ADJECTIVES)} {rng.choice(nouns)} {number}'
+
+
+def _location(rng):
+    return rng.choices(CITIES, weights=[weight for _, _, weight in CITIES])[0][:2]
+
+
+def _phone(rng):
+    return f'{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}'
+
+
+def generate_venues(rng, count):
+    for number in range(1, count + 1):
+        city, state = _location(rng)
+        yield number, {
+            'name': _name(rng, NOUNS, number),
+            'city': city,
+            'state': state,
+            'address': f'{rng.randint(1, 9999)} {rng.choice(NOUNS)} Street',
+            'phone': _phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://example.com/venues/{number}.jpg',
+            'facebook_link': f'https://www.facebook.com/venue{number}',
+            'seeking_talent': rng.random() < 0.3,
+        }
+
+
+def generate_artists(rng, count):
+    for number in range(1, count + 1):
+        city, state = _location(rng)
+        yield number, {
+            'name': _name(rng, BAND_NOUNS, number),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://example.com/artists/{number}.jpg',
+            'seeking_venue': rng.random() < 0.3,
+        }
+
+
+def generate_shows(rng, count, venue_ids, artist_ids, now):
+    # Venues are more skewed than artists; shows span the past and the
+    # next year, so about half of them are upcoming. Each show takes a
+    # free slot of its venue, as the venues cannot be double booked.
+    venue_weights = _zipf_weights(len(venue_ids), 1.1)
+    artist_weights = _zipf_weights(len(artist_ids), 0.8)
+    slots = 525600 // DEFAULT_SHOW_DURATION
+    booked = set()
+    for number in range(1, count + 1):
+        while True:
+            venue_id = _pick(rng, venue_ids, venue_weights)
+            slot = rng.randrange(-slots, slots)
+            if (venue_id, slot) not in booked:
+                booked.add((venue_id, slot))
+                break
+        yield number, {
+            'artist_id': _pick(rng, artist_ids, artist_weights),
+            'venue_id': venue_id,
+            'start_time': now + timedelta(minutes=slot * DEFAULT_SHOW_DURATION),
+        }
+
+
+def seed_dataset(shows, seed=0, batch_size=10000, progress=None):
+    '''Load a synthetic dataset of the given number of shows.
+
+    The same seed always gives the same dataset, so benchmark runs on
+    different commits measure the same data. Expects empty tables.
+    '''
+    rng = random.Random(seed)
+    venues, artists = dataset_size(shows)
+    bulk_import('venues', generate_venues(rng, venues), batch_size, progress=progress)
+    bulk_import('artists', generate_artists(rng, artists), batch_size, progress=progress)
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    db.session.remove()
+    # Show times are relative to today's midnight, so every seeded
+    # dataset has the same share of past and upcoming shows
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # A partition for every month of the shows, so none of them lands in
+    # the default partition
+    with db.engine.begin() as connection:
+        create_partitions(connection, now - timedelta(days=366), now + timedelta(days=366))
+    bulk_import('shows', generate_shows(rng, shows, venue_ids, artist_ids, now),
+                batch_size, progress=progress)
+    return venues, artists
+
+
+def reset_dataset():
+    with db.engine.begin() as connection:
+        connection.execute(f'TRUNCATE {Shows.__tablename__}, "{Venue.__tablename__}", '
+                           f'"{Artist.__tablename__}" RESTART IDENTITY CASCADE')
+        connection.execute('ANALYZE')
+
+#----------------------------------------------------------------------------#
+# Benchmark runner.
+#----------------------------------------------------------------------------#
+
+
+def benchmark_requests():
+    '''(name, method, url, form data) of the benchmarked routes.
+
+    The detail pages are measured for the busiest venue and artist (the
+    worst case) and for a median one.
+    '''
+    def by_shows(column):
+        counts = db.session.query(column).group_by(column).order_by(
+            db.func.count(Shows.id).desc(), column).all()
+        return counts[0][0], counts[len(counts) // 2][0]
+
+    busiest_venue, median_venue = by_shows(Shows.venue_id)
+    busiest_artist, median_artist = by_shows(Shows.artist_id)
+    db.session.remove()
+    return [
+        ('venues', 'GET', '/venues', None),
+        ('artists', 'GET', '/artists', None),
+        ('shows', 'GET', '/shows', None),
+        ('shows_stream', 'GET', '/shows?stream=1', None),
+        ('show_venue_busiest', 'GET', f'/venues/{busiest_venue}', None),
+        ('show_venue_median', 'GET', f'/venues/{median_venue}', None),
+        ('show_artist_busiest', 'GET', f'/artists/{busiest_artist}', None),
+        ('show_artist_median', 'GET', f'/artists/{median_artist}', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': 'golden hop'}),
+        ('search_artists', 'POST', '/artists/search', {'search_term': 'band'}),
+        ('api_shows', 'GET', '/api/v1/shows?per_page=200', None),
+    ]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def _summary(timings):
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "p95": _percentile(timings, 95),
+        "max": max(timings),
+    }
+
+
+def run_benchmark(repeat=10, warmup=2, routes=None, cached=False, progress=None):
+    '''Time each benchmarked route and the SQL it runs.
+
+    Every route is requested warmup times, then repeat times measured.
+    Unless cached is set the search and fragment caches are disabled,
+    so each request does all of its queries. Returns the results dict.
+    '''
+    from app import caches_disabled
+    caches = ExitStack()
+    if not cached:
+        caches.enter_context(caches_disabled())
+
+    statements = []
+
+    # Start times are kept on the execution context, which a failed
+    # statement discards (see metrics.py)
+    def start(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.benchmark_started = time.perf_counter()
+
+    def end(conn, cursor, statement, parameters, context, executemany):
+        if context is None or not hasattr(context, 'benchmark_started'):
+            return
+        statements.append((statement, time.perf_counter() - context.benchmark_started))
+
+    client = app.test_client()
+    results = {}
+    event.listen(Engine, 'before_cursor_execute', start)
+    event.listen(Engine, 'after_cursor_execute', end)
+    try:
+        for name, method, url, data in benchmark_requests():
+            if routes and name not in routes:
+                continue
+            for _ in range(warmup):
+                client.open(url, method=method, data=data).get_data()
+            timings, db_times, query_times = [], [], {}
+            for _ in range(repeat):
+                statements.clear()
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                response.get_data()
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{method} {url} returned {response.status_code}')
+                db_times.append(sum(elapsed for _, elapsed in statements))
+                for statement, elapsed in statements:
+                    query_times.setdefault(statement, []).append(elapsed)
+            results[name] = {
+                "method": method,
+                "url": url,
+                "time": _summary(timings),
+                "db_time": _summary(db_times),
+                "queries": len(statements),
+                "statements": [{"sql": statement, "runs": len(times), **_summary(times)}
+                               for statement, times in query_times.items()],
+            }
+            if progress is not None:
+                progress(name, results[name])
+    finally:
+        event.remove(Engine, 'before_cursor_execute', start)
+        event.remove(Engine, 'after_cursor_execute', end)
+        caches.close()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, directory, repeat, cached):
+    '''Store a run with what it ran on, return the file path.'''
+    counts = {model.__name__: db.session.query(db.func.count(model.id)).scalar()
+              for model in (Venue, Artist, Shows)}
+    server_version = db.session.execute('SHOW server_version').scalar()
+    db.session.remove()
+    run = {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "postgresql": server_version,
+        "rows": counts,
+        "repeat": repeat,
+        "cached": cached,
+        "routes": results,
+    }
+    os.makedirs(directory, exist_ok=True)
+    name = '{}-{}shows-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S'),
+                                       counts['Shows'], run['commit'] or 'nogit')
+    path = os.path.join(directory, name)
+    with open(path, 'w') as results_file:
+        json.dump(run, results_file, indent=2)
+    return path
+
+
+def compare_runs(base, new):
+    '''Yield (route, base median, new median, ratio) for the common routes.'''
+    for name, result in new['routes'].items():
+        if name in base['routes']:
+            before = base['routes'][name]['time']['median']
+            after = result['time']['median']
+            yield name, before, after, after / before if before else float('inf')
@@ -0,0 +1,301 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Venue, Artist, Shows
+
+#----------------------------------------------------------------------------#
+# LRU cache.
+#----------------------------------------------------------------------------#
+
+
+class LRUCache(object):
+    '''Bounded in-process cache evicting the least recently used entry.
+
+    Entries also expire after timeout seconds, so values derived from
+    the clock (e.g. upcoming show counts) do not live forever.
+    '''
+
+    # Whether get and set block on I/O, so async callers use a thread
+    blocking = False
+
+    def __init__(self, maxsize=256, timeout=60):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+
+class FileSystemBackend(object):
+    '''Cache backend storing one pickle file per key in a directory.
+
+    Unlike LRUCache it can be shared by every worker process on a host,
+    so an invalidation made by one worker is seen by all of them. Each
+    file starts with its expiry time, so a sweep every sweep_interval
+    seconds removes the expired entries without unpickling them, then
+    the least recently written ones above maxsize.
+    '''
+
+    # Expiry time (Unix seconds, inf for never) written before the value
+    HEADER = struct.Struct('<d')
+
+    blocking = True
+
+    def __init__(self, directory, timeout=300, maxsize=None, sweep_interval=60):
+        self.directory = directory
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), 'rb') as cache_file:
+                expires, = self.HEADER.unpack(cache_file.read(self.HEADER.size))
+                if expires >= time.time():
+                    return pickle.load(cache_file)
+        except (OSError, EOFError, struct.error, pickle.UnpicklingError):
+            return default
+        self.delete(key)
+        return default
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        # Write to a temporary file first so readers never see half a value
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as cache_file:
+            cache_file.write(self.HEADER.pack(time.time() + timeout))
+            pickle.dump(value, cache_file)
+        os.replace(temp_path, self._path(key))
+        if time.time() >= self._next_sweep:
+            self.sweep()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def sweep(self):
+        '''Remove the expired entries and the oldest ones above maxsize.
+
+        Entries under an outdated data version are never read again, so
+        without it the directory would only grow. Returns the number of
+        files removed.
+        '''
+        now = time.time()
+        self._next_sweep = now + self.sweep_interval
+        removed, kept = 0, []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.startswith('.'):
+                    # A temporary file left behind by a crashed writer
+                    expired = entry.stat().st_mtime < now - self.sweep_interval
+                else:
+                    with open(entry.path, 'rb') as cache_file:
+                        expires, = self.HEADER.unpack(cache_file.read(self.HEADER.size))
+                    expired = expires < now
+                if expired:
+                    os.remove(entry.path)
+                    removed += 1
+                elif not entry.name.startswith('.'):
+                    kept.append((entry.stat().st_mtime, entry.path))
+            except (OSError, struct.error):
+                # Removed or replaced by another worker meanwhile
+                continue
+        if self.maxsize is not None and len(kept) > self.maxsize:
+            kept.sort()
+            for _, path in kept[:len(kept) - self.maxsize]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+def create_backend(config):
+    '''Build the FRAGMENT_CACHE_BACKEND ("memory" or "filesystem").'''
+    timeout = config['FRAGMENT_CACHE_TIMEOUT']
+    if config['FRAGMENT_CACHE_BACKEND'] == 'filesystem':
+        return FileSystemBackend(config['FRAGMENT_CACHE_DIR'], timeout,
+                                 config['FRAGMENT_CACHE_SIZE'])
+    return LRUCache(config['FRAGMENT_CACHE_SIZE'], timeout)
+
+
+class FragmentCache(object):
+    '''Rendered page fragments keyed by entity and its data version.
+
+    The data version of an entity is the time it was last invalidated,
+    kept in the backend. Invalidating an entity gives it a new version,
+    so its old fragments are never read again and simply expire. A
+    version missing from the backend is recreated from the clock, which
+    can only make a fragment miss, never serve a stale one.
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _version(self, model, id):
+        version = self.backend.get(('version', model, id))
+        if version is None:
+            version = self.invalidate(model, id)
+        return version
+
+    def key(self, model, id, variant=None):
+        '''Key of a fragment of the current version of an entity.
+
+        Take the key before loading the data to render, so a change
+        committed meanwhile leaves the fragment under an outdated key.
+        '''
+        return ('fragment', model, id, variant, self._version(model, id))
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout)
+
+    def invalidate(self, model, id):
+        version = time.time_ns()
+        self.backend.set(('version', model, id), version, float('inf'))
+        return version
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+# Callbacks run after a commit that changed venues, artists or shows.
+# Each one gets a set of ("Venue" | "Artist", id) pairs; a show change
+# is reported as a change of its venue and of its artist.
+invalidation_hooks = []
+
+
+def on_change(hook):
+    invalidation_hooks.append(hook)
+    return hook
+
+
+def mark_changed(session, model, *ids):
+    '''Record changes made outside the ORM (e.g. bulk inserts).'''
+    # Form data may still hold ids as strings until the objects expire
+    session.info.setdefault('changed', set()).update(
+        (model.__name__, int(id)) for id in ids)
+
+
+# Fields of a venue shown on the pages of the artists who play there,
+# and of an artist shown on the pages of the venues hosting it
+LINKED_FIELDS = ('name', 'image_link')
+
+
+def _linked_ids(session, column, key, ids):
+    return [id for id, in session.query(column).filter(key.in_(ids)).distinct()]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    relisted = {Venue: set(), Artist: set()}
+    dirty = session.dirty
+    for obj in list(session.new) + list(dirty) + list(session.deleted):
+        if isinstance(obj, (Venue, Artist)):
+            mark_changed(session, type(obj), obj.id)
+            if obj in dirty and any(inspect(obj).attrs[field].history.has_changes()
+                                    for field in LINKED_FIELDS):
+                relisted[type(obj)].add(obj.id)
+        elif isinstance(obj, Shows):
+            mark_changed(session, Venue, obj.venue_id)
+            mark_changed(session, Artist, obj.artist_id)
+    # A renamed venue changes the pages of its artists, and the other way
+    # around
+    if relisted[Venue]:
+        mark_changed(session, Artist, *_linked_ids(
+            session, Shows.artist_id, Shows.venue_id, relisted[Venue]))
+    if relisted[Artist]:
+        mark_changed(session, Venue, *_linked_ids(
+            session, Shows.venue_id, Shows.artist_id, relisted[Artist]))
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_invalidation_hooks(session):
+    changed = session.info.pop('changed', None)
+    if changed:
+        for hook in invalidation_hooks:
+            hook(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('changed', None)
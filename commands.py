@@ -0,0 +1,339 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import re
+import click
+from datetime import datetime
+from sqlalchemy import event
+from models import (app, db, Venue, Shows, sweep_show_counters,
+                    is_booking_conflict)
+from importer import IMPORTS, read_records, bulk_import
+from partitions import (is_partition, list_partitions, empty_partitions,
+                        create_partitions, create_partitions_ahead,
+                        detach_partitions)
+from loadtest import DEFAULT_MIX, run_load
+from benchmark import (dataset_size, seed_dataset, reset_dataset, run_benchmark,
+                       save_results, compare_runs)
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+
+@app.cli.command('sweep-shows')
+def sweep_shows():
+    '''Refresh the upcoming show counters of shows that have started.
+
+    Run it periodically (e.g. every minute from cron) so the counters on
+    the listing pages stop counting shows that are now in the past.
+    '''
+    with db.engine.begin() as connection:
+        refreshed = sweep_show_counters(connection)
+    click.echo(f'Refreshed the show counters of {refreshed} venues/artists')
+
+
+def _scans(plan, table):
+    '''Yield the scans of table or of its partitions in an EXPLAIN (FORMAT
+    JSON) plan.'''
+    relation = plan.get('Relation Name')
+    if relation == table or relation and is_partition(relation):
+        yield plan
+    for child in plan.get('Plans', []):
+        yield from _scans(child, table)
+
+
+@app.cli.command('check-indexes')
+def check_indexes():
+    '''Check that the hot pages read the shows table through its indexes.
+
+    Requests the listing, detail and search pages through the test
+    client, captures the SQL they run and EXPLAINs every statement that
+    touches shows. Run it against a seeded database: on a table of a few
+    hundred rows the planner rightly prefers a sequential scan.
+    '''
+    venue_id = db.session.query(Shows.venue_id).group_by(Shows.venue_id).order_by(
+        db.func.count(Shows.id).desc()).limit(1).scalar()
+    artist_id = db.session.query(Shows.artist_id).group_by(Shows.artist_id).order_by(
+        db.func.count(Shows.id).desc()).limit(1).scalar()
+    shows_count = db.session.query(db.func.count(Shows.id)).scalar()
+    db.session.remove()
+    if venue_id is None:
+        raise click.ClickException('The shows table is empty, seed it first')
+    if shows_count < 10000:
+        click.echo(f'Warning: only {shows_count} shows, sequential scans '
+                   'may be the cheapest plan at this size')
+
+    requests = [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', f'/venues/{venue_id}', None),
+        ('GET', f'/artists/{artist_id}', None),
+        ('POST', '/venues/search', {'search_term': 'a'}),
+        ('POST', '/artists/search', {'search_term': 'a'}),
+    ]
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') \
+                and re.search(r'\b(FROM|JOIN)\s+shows\b', statement):
+            statements.append((statement, parameters))
+
+    # Cached pages run no query to check
+    from app import caches_disabled
+    failures = 0
+    client = app.test_client()
+    with db.engine.connect() as connection, caches_disabled():
+        # Empty partitions (e.g. the months ahead) are rightly read
+        # sequentially, there is nothing to index
+        empty = empty_partitions(connection)
+        for method, url, data in requests:
+            statements.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                client.open(url, method=method, data=data)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+            for statement, parameters in statements:
+                plan = connection.execute(
+                    'EXPLAIN (FORMAT JSON) ' + statement, parameters
+                ).scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                scanned = list(_scans(plan[0]['Plan'], Shows.__tablename__))
+                scans = [scan for scan in scanned if scan['Node Type'] == 'Seq Scan'
+                         and scan['Relation Name'] not in empty]
+                failures += bool(scans)
+                partitions = {scan['Relation Name'] for scan in scanned}
+                click.echo(f'{method} {url}: ' + (
+                    'sequential scan on shows' if scans else 'index scans') +
+                    f' ({len(partitions)} partitions)')
+    if failures:
+        raise click.ClickException(
+            f'{failures} statements scan the whole shows table')
+
+
+@app.cli.command('import')
+@click.argument('entity', type=click.Choice(sorted(IMPORTS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows validated and copied per batch.')
+@click.option('--dry-run', is_flag=True,
+              help='Validate and load everything, then roll back.')
+def import_data(entity, source, format, batch_size, dry_run):
+    '''Bulk load venues, artists or shows from a csv or ndjson file.
+
+    Uses PostgreSQL COPY in a single transaction. Rows with missing
+    fields, bad values, unknown artist/venue ids or booking a venue
+    already taken are skipped and reported.
+    '''
+    if format is None:
+        format = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    def progress(result):
+        click.echo(f'{result.imported} rows loaded, {len(result.rejected)} rejected '
+                   f'({result.rows_per_second:.0f} rows/s)')
+
+    try:
+        result, changed = bulk_import(entity, read_records(source, format),
+                                      batch_size, dry_run, progress)
+    except Exception as error:
+        if not is_booking_conflict(error):
+            raise
+        # Booked meanwhile by a writer not taking the booking locks (e.g.
+        # raw SQL). The import is one transaction, so nothing was loaded
+        raise click.ClickException('Shows double booking a venue, nothing was '
+                                   'imported: ' + str(getattr(error, 'orig', error)).strip())
+    for number, reason in result.rejected[:20]:
+        click.echo(f'Rejected line {number}: {reason}', err=True)
+    if len(result.rejected) > 20:
+        click.echo(f'... and {len(result.rejected) - 20} more', err=True)
+    if dry_run:
+        click.echo(f'Dry run: {result.imported} rows would be imported')
+        return
+    click.echo(f'Imported {result.imported} {entity} '
+               f'at {result.rows_per_second:.0f} rows/s')
+
+    # Drop the cached pages of the venues and artists that got new shows
+    # (only reaches other workers with a shared fragment cache backend)
+    from app import fragment_cache
+    for model, ids in changed.items():
+        for id in ids:
+            fragment_cache.invalidate(model.__name__, id)
+
+
+@app.cli.group()
+def partitions():
+    '''Manage the monthly partitions of the shows table.'''
+
+
+@partitions.command('list')
+def partitions_list():
+    '''List the partitions with their estimated rows and size.'''
+    with db.engine.connect() as connection:
+        rows = list_partitions(connection)
+    for name, start, end, estimated_rows, size in rows:
+        bounds = f'{start:%Y-%m-%d} to {end:%Y-%m-%d}' if start else 'anything else'
+        click.echo(f'{name:16} {bounds:26} {estimated_rows:>10} rows '
+                   f'{size / 1048576:>9.1f} MB')
+
+
+@partitions.command('create')
+@click.option('--ahead', type=int, help='Months after the current one, '
+              'SHOW_PARTITIONS_AHEAD by default.')
+@click.option('--from', 'start', type=click.DateTime(['%Y-%m']),
+              help='Also create the partitions from this month, e.g. 2019-01.')
+def partitions_create(ahead, start):
+    '''Create the missing partitions up to some months ahead.
+
+    Run it periodically (e.g. monthly from cron) so shows never pile up
+    in the default partition; the ones already there are moved.
+    '''
+    if ahead is None:
+        ahead = app.config['SHOW_PARTITIONS_AHEAD']
+    with db.engine.begin() as connection:
+        created = create_partitions_ahead(connection, ahead)
+        if start is not None:
+            created += create_partitions(connection, start, datetime.now())
+    click.echo(f'Created {len(created)} partitions' +
+               (': ' + ', '.join(sorted(created)) if created else ''))
+
+
+@partitions.command('detach')
+@click.option('--before', required=True, type=click.DateTime(['%Y-%m']),
+              help='Detach the months before this one, e.g. 2020-01.')
+@click.option('--drop', is_flag=True, help='Drop the detached partitions.')
+def partitions_detach(before, drop):
+    '''Take the shows of old months out of the shows table.
+
+    Detaching only updates the catalog, however many shows the months
+    hold. The partitions are left as plain tables (e.g. to pg_dump them
+    before dropping) unless --drop is given.
+    '''
+    if drop:
+        click.confirm('This deletes the shows of every month before '
+                      f'{before:%Y-%m}. Continue?', abort=True)
+    try:
+        with db.engine.begin() as connection:
+            detached = detach_partitions(connection, before, drop)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'{"Dropped" if drop else "Detached"} {len(detached)} partitions' +
+               (': ' + ', '.join(detached) if detached else ''))
+
+
+@app.cli.group()
+def bench():
+    '''Seed a synthetic dataset and benchmark the pages against it.'''
+
+
+@bench.command('seed')
+@click.option('--shows', default=100000, show_default=True,
+              help='Shows to generate, e.g. 1000, 100000 or 1000000.')
+@click.option('--seed', default=0, show_default=True,
+              help='Random seed; the same seed gives the same dataset.')
+@click.option('--reset', is_flag=True,
+              help='Delete ALL venues, artists and shows first.')
+def bench_seed(shows, seed, reset):
+    '''Load venues, artists and shows with a realistic skew.
+
+    A few venues host most of the shows and a few cities have most of
+    the venues, like the real data the pages have to cope with.
+    '''
+    if reset:
+        click.confirm('This deletes every venue, artist and show. Continue?',
+                      abort=True)
+        reset_dataset()
+    elif db.session.query(Venue.query.exists()).scalar():
+        raise click.ClickException('The database already has venues, '
+                                   'use --reset to replace them')
+    db.session.remove()
+    venues, artists = dataset_size(shows)
+    click.echo(f'Seeding {venues} venues, {artists} artists and {shows} shows')
+    seed_dataset(shows, seed, progress=lambda result: click.echo(
+        f'{result.imported} rows ({result.rows_per_second:.0f} rows/s)'))
+    with db.engine.connect() as connection:
+        connection.execute('ANALYZE')
+
+
+@bench.command('run')
+@click.option('--repeat', default=10, show_default=True,
+              help='Measured requests per route.')
+@click.option('--warmup', default=2, show_default=True,
+              help='Unmeasured requests per route first.')
+@click.option('--route', 'routes', multiple=True,
+              help='Only benchmark this route (repeatable).')
+@click.option('--cached', is_flag=True,
+              help='Keep the search and fragment caches enabled.')
+def bench_run(repeat, warmup, routes, cached):
+    '''Time the pages and their queries, and store the results.'''
+    def progress(name, result):
+        click.echo(f'{name:22} median {result["time"]["median"] * 1000:9.1f} ms  '
+                   f'p95 {result["time"]["p95"] * 1000:9.1f} ms  '
+                   f'db {result["db_time"]["median"] * 1000:9.1f} ms  '
+                   f'{result["queries"]} queries')
+
+    results = run_benchmark(repeat, warmup, routes, cached, progress)
+    path = save_results(results, app.config['BENCHMARK_DIR'], repeat, cached)
+    click.echo(f'Results saved to {path}')
+
+
+@bench.command('compare')
+@click.argument('base', type=click.File('r'))
+@click.argument('new', type=click.File('r'))
+def bench_compare(base, new):
+    '''Compare the median times of two stored benchmark runs.'''
+    base, new = json.load(base), json.load(new)
+    if base['rows'] != new['rows']:
+        click.echo(f'Warning: the runs used different datasets '
+                   f'({base["rows"]} and {new["rows"]})')
+    for name, before, after, ratio in compare_runs(base, new):
+        click.echo(f'{name:22} {before * 1000:9.1f} ms -> {after * 1000:9.1f} ms  '
+                   f'({ratio:.2f}x)')
+
+
+def _mix(ctx, param, values):
+    mix = dict(DEFAULT_MIX)
+    for value in values:
+        kind, _, weight = value.partition('=')
+        if kind not in mix or not weight.isdigit():
+            raise click.BadParameter(f'expected KIND=WEIGHT with KIND one of '
+                                     f'{", ".join(DEFAULT_MIX)}, got {value}')
+        mix[kind] = int(weight)
+    return mix
+
+
+@bench.command('load')
+@click.option('--clients', default=10, show_default=True,
+              help='Concurrent clients.')
+@click.option('--duration', default=30, show_default=True,
+              help='Seconds to run.')
+@click.option('--mix', callback=_mix, multiple=True,
+              help='Weight of a request kind, e.g. --mix create=0 '
+                   f'(default {", ".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())}).')
+@click.option('--url', help='Load a running server (e.g. http://127.0.0.1:8000) '
+                            'instead of the app in this process.')
+def bench_load(clients, duration, mix, url):
+    '''Load the app with a mix of requests from concurrent clients.
+
+    Reports the throughput and the latency distribution, overall and per
+    kind of request. Create requests add shows: use --mix create=0
+    against data you want to keep.
+    '''
+    try:
+        result = run_load(clients, duration, mix, url)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'{result.latency.total} requests in {result.elapsed:.1f}s from '
+               f'{clients} clients: {result.throughput:.1f} requests/s')
+    click.echo(f'{"":10} {"count":>8} {"errors":>7} {"p50":>9} {"p95":>9} '
+               f'{"p99":>9} {"p99.9":>9} {"max":>9}  (ms)')
+    rows = list(result.by_kind.items()) + [('all', result.latency)]
+    for kind, histogram in rows:
+        errors = sum(result.errors.values()) if kind == 'all' else result.errors[kind]
+        click.echo(f'{kind:10} {histogram.total:8} {errors:7} ' + ' '.join(
+            f'{histogram.percentile(percent) * 1000:9.1f}'
+            for percent in (50, 95, 99, 99.9, 100)))
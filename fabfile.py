@@ -7,12 +7,24 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m compileall -q . && python -m pytest -q", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def check_indexes():
+    # Needs a seeded database, e.g. after `fab benchmark`
+    local("FLASK_APP=app.py flask check-indexes")
+
+
+def benchmark(shows=100000):
+    # Seeds a fresh synthetic dataset: never run it against real data
+    local("FLASK_APP=app.py flask bench seed --reset --shows {}".format(shows))
+    local("FLASK_APP=app.py flask bench run")
+    check_indexes()
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,9 +51,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run FLASK_APP=app.py flask check-indexes")
 
 
 def deploy():
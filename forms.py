@@ -1,10 +1,20 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, ValidationError, NumberRange
 import re
+from pagination import INT4_MAX
 
 
+# Minutes a show books its venue for, unless told otherwise
+DEFAULT_SHOW_DURATION = 120
+
+
+def is_id(value):
+    # Ids are PostgreSQL integers
+    value = (value or '').strip()
+    return value.isdigit() and 1 <= int(value) <= INT4_MAX
+
 GENERE_CHOICES = [
             ('Alternative', 'Alternative'),
             ('Blues', 'Blues'),
@@ -83,17 +93,78 @@ STATE_CHOICES = [
 
 
 class ShowForm(FlaskForm):
+    def validate_id(self, field):
+        if not is_id(field.data):
+            raise ValidationError(f'Error, {field.name} must be a positive number')
+
     artist_id = StringField(
-        'artist_id'
+        'artist_id', validators=[validate_id]
     )
     venue_id = StringField(
-        'venue_id'
+        'venue_id', validators=[validate_id]
     )
     start_time = DateTimeField(
         'start_time',
-        validators=[DataRequired()],
+        validators=[DataRequired(message='Error, start time must be in format YYYY-MM-DD HH:MM:SS')],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[NumberRange(min=1, message='Error, a show lasts at least a minute')],
+        default=DEFAULT_SHOW_DURATION
+    )
+
+class ShowBatchForm(FlaskForm):
+    # One "artist_id, venue_id, start_time[, duration]" show per line of
+    # the lineup, the duration in minutes
+    TIME_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S')
+
+    def _check_overlaps(self, numbers):
+        # Shows of the lineup booking a venue at the same time, found by
+        # sorting them per venue and comparing each to the previous one
+        order = sorted(range(len(self.shows)), key=lambda index: (
+            self.shows[index]['venue_id'], self.shows[index]['start_time']))
+        for previous, index in zip(order, order[1:]):
+            before, show = self.shows[previous], self.shows[index]
+            if before['venue_id'] == show['venue_id'] and show['start_time'] < \
+                    before['start_time'] + timedelta(minutes=before['duration']):
+                raise ValidationError(
+                    f'Error, lines {numbers[previous]} and {numbers[index]} book venue {show["venue_id"]} at the same time')
+
+    def validate_lineup(self, lineup):
+        self.shows = []
+        numbers = []
+        for number, line in enumerate(lineup.data.splitlines(), 1):
+            if not line.strip():
+                continue
+            parts = [part.strip() for part in line.split(',')]
+            if len(parts) not in (3, 4) or not is_id(parts[0]) or not is_id(parts[1]):
+                raise ValidationError(
+                    f'Error, line {number} must be in format artist_id, venue_id, YYYY-MM-DD HH:MM[, minutes]')
+            if len(parts) == 4 and (not parts[3].isdigit() or int(parts[3]) < 1):
+                raise ValidationError(
+                    f'Error, duration on line {number} must be a number of minutes')
+            for time_format in self.TIME_FORMATS:
+                try:
+                    start_time = datetime.strptime(parts[2], time_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValidationError(
+                    f'Error, start time on line {number} must be in format YYYY-MM-DD HH:MM')
+            self.shows.append({
+                'artist_id': int(parts[0]),
+                'venue_id': int(parts[1]),
+                'start_time': start_time,
+                'duration': int(parts[3]) if len(parts) == 4 else DEFAULT_SHOW_DURATION
+            })
+            numbers.append(number)
+        self._check_overlaps(numbers)
+
+    lineup = TextAreaField(
+        'lineup', validators=[DataRequired()]
+    )
 
 class VenueForm(FlaskForm):
     def validate_phone(self, phone):
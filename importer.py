@@ -0,0 +1,285 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+import dateutil.parser
+from datetime import datetime, timedelta
+from itertools import islice
+from forms import DEFAULT_SHOW_DURATION
+from pagination import INT4_MAX
+from models import (db, Venue, Artist, Shows, refresh_show_counters, genre_mask,
+                    lock_venue_bookings)
+
+#----------------------------------------------------------------------------#
+# Bulk import through PostgreSQL COPY.
+#----------------------------------------------------------------------------#
+
+# Columns loaded per entity; the first ones are required
+VENUE_COLUMNS = ['name', 'city', 'state', 'address', 'phone', 'genres',
+                 'image_link', 'facebook_link', 'website', 'seeking_talent',
+                 'seeking_description']
+ARTIST_COLUMNS = ['name', 'city', 'state', 'phone', 'genres', 'image_link',
+                  'facebook_link', 'website', 'seeking_venue',
+                  'seeking_description']
+SHOW_COLUMNS = ['artist_id', 'venue_id', 'start_time', 'duration']
+
+IMPORTS = {
+    'venues': (Venue, VENUE_COLUMNS, 6),
+    'artists': (Artist, ARTIST_COLUMNS, 5),
+    'shows': (Shows, SHOW_COLUMNS, 3),
+}
+
+
+class ImportResult(object):
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = []  # (line number, reason)
+        self.started = time.monotonic()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.imported / elapsed if elapsed else 0.0
+
+
+class InvalidRecord(object):
+    '''A line that could not be read as a record, rejected by _prepare.'''
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def _json_record(line):
+    try:
+        record = json.loads(line)
+    except ValueError as error:
+        return InvalidRecord(f'invalid JSON: {error}')
+    if not isinstance(record, dict):
+        return InvalidRecord('not a JSON object')
+    return record
+
+
+def read_records(stream, format):
+    '''Yield (line number, dict) from a csv (with header) or ndjson file.
+
+    An ndjson line that is not a JSON object comes as an InvalidRecord,
+    so it is reported with the other rejected rows.
+    '''
+    if format == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, _json_record(line)
+    else:
+        # The header is line 1, so records start on line 2
+        for number, record in enumerate(csv.DictReader(stream), 2):
+            yield number, record
+
+
+def _genres(values):
+    if isinstance(values, str):
+        # csv cells hold genres as "Jazz,Rock n Roll"
+        return [value.strip() for value in values.split(',') if value.strip()]
+    return list(values)
+
+
+def _array_literal(values):
+    items = ('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+             for value in values)
+    return '{' + ','.join(items) + '}'
+
+
+def _boolean(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 't', 'true', 'y', 'yes')
+    return bool(value)
+
+
+def _copy_value(column, value):
+    if value is None or value == '':
+        # COPY does not apply column defaults to the listed columns
+        return DEFAULT_SHOW_DURATION if column == 'duration' else None
+    if column == 'genres':
+        return _array_literal(_genres(value))
+    if column in ('seeking_talent', 'seeking_venue'):
+        return 't' if _boolean(value) else 'f'
+    if column in ('artist_id', 'venue_id', 'duration'):
+        # Out of range values would fail the whole COPY
+        if not 1 <= int(value) <= INT4_MAX:
+            raise ValueError(f'invalid {column} {value}')
+        return int(value)
+    if column == 'start_time':
+        return dateutil.parser.parse(value).isoformat() \
+            if isinstance(value, str) else value.isoformat()
+    return value
+
+
+def _prepare(batch, columns, required, result):
+    '''Convert a batch of records to COPY rows, rejecting invalid ones.'''
+    rows = []
+    for number, record in batch:
+        if isinstance(record, InvalidRecord):
+            result.rejected.append((number, record.reason))
+            continue
+        try:
+            row = [_copy_value(column, record.get(column)) for column in columns]
+        except (ValueError, TypeError, AttributeError, OverflowError) as error:
+            result.rejected.append((number, str(error)))
+            continue
+        missing = [column for column, value in zip(columns[:required], row)
+                   if value is None]
+        if missing:
+            result.rejected.append((number, 'missing ' + ', '.join(missing)))
+            continue
+        if 'genres' in columns:
+            # COPY bypasses the mapper event maintaining genre_mask
+            row.append(genre_mask(_genres(record['genres'])))
+        rows.append((number, row))
+    return rows
+
+
+def _existing_ids(cursor, model, ids):
+    cursor.execute(f'SELECT id FROM "{model.__tablename__}" WHERE id = ANY(%s)',
+                   (list(ids),))
+    return {id for id, in cursor}
+
+
+def _check_references(cursor, rows, result):
+    '''Drop shows whose artist or venue does not exist, one query per table.'''
+    artists = _existing_ids(cursor, Artist, {row[0] for _, row in rows})
+    venues = _existing_ids(cursor, Venue, {row[1] for _, row in rows})
+    valid = []
+    for number, row in rows:
+        if row[0] not in artists:
+            result.rejected.append((number, f'unknown artist {row[0]}'))
+        elif row[1] not in venues:
+            result.rejected.append((number, f'unknown venue {row[1]}'))
+        else:
+            valid.append((number, row))
+    return valid
+
+
+def _show_time(row):
+    # As PostgreSQL reads it into a timestamp column, ignoring any offset
+    return datetime.fromisoformat(row[2]).replace(tzinfo=None)
+
+
+# A stored show overlapping each imported one, if any. A LATERAL probe
+# per show: the WHERE clause matches the exclusion constraints, so each
+# partition is searched through their GiST index, and partitions
+# starting after the show are pruned. The lineup comes as arrays,
+# cheaper to send than a VALUES list.
+BOOKED_SHOWS = """
+    SELECT lineup.number, booked.id
+    FROM unnest(%s::integer[], %s::integer[], %s::timestamp[], %s::integer[])
+        AS lineup(number, venue_id, start_time, duration)
+    CROSS JOIN LATERAL (
+        SELECT shows.id FROM shows
+        WHERE int4range(shows.venue_id, shows.venue_id, '[]')
+              = int4range(lineup.venue_id, lineup.venue_id, '[]')
+          AND tsrange(shows.start_time, shows.start_time + shows.duration * interval '1 minute')
+              && tsrange(lineup.start_time, lineup.start_time + lineup.duration * interval '1 minute')
+          AND shows.start_time < lineup.start_time + lineup.duration * interval '1 minute'
+        LIMIT 1
+    ) AS booked
+"""
+
+
+def _check_bookings(cursor, rows, result):
+    '''Drop shows double booking a venue, with one query per batch.
+
+    The exclusion constraint of a partition only sees the shows of its
+    month, so each show is checked against every stored one (those of
+    the earlier batches included) and against the rest of its batch.
+    Run under lock_venue_bookings().
+    '''
+    cursor.execute(BOOKED_SHOWS, (
+        [number for number, _ in rows], [row[1] for _, row in rows],
+        # Read by PostgreSQL as COPY reads them
+        [row[2] for _, row in rows], [row[3] for _, row in rows]))
+    booked = dict(cursor)
+
+    # Within the batch: per venue by start time, each show against the
+    # last one kept, which ends the latest
+    valid = []
+    last_kept = {}  # venue id -> (line number, end time)
+    for number, row in sorted(rows, key=lambda item: (item[1][1], _show_time(item[1]))):
+        venue_id, start_time = row[1], _show_time(row)
+        if number in booked:
+            result.rejected.append(
+                (number, f'venue {venue_id} is already booked (show {booked[number]})'))
+            continue
+        previous = last_kept.get(venue_id)
+        if previous is not None and start_time < previous[1]:
+            result.rejected.append(
+                (number, f'venue {venue_id} is booked by line {previous[0]}'))
+            continue
+        last_kept[venue_id] = (number, start_time + timedelta(minutes=row[3]))
+        valid.append((number, row))
+    return sorted(valid, key=lambda item: item[0])
+
+
+def _copy(cursor, model, columns, rows):
+    if 'genres' in columns:
+        columns = columns + ['genre_mask']
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(row for _, row in rows)
+    buffer.seek(0)
+    column_list = ', '.join(columns)
+    cursor.copy_expert(f'COPY "{model.__tablename__}" ({column_list}) '
+                       'FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def bulk_import(entity, records, batch_size=5000, dry_run=False,
+                progress=None):
+    '''Load records into the entity table with COPY, in one transaction.
+
+    Rows are validated and copied batch by batch; show references and
+    bookings are checked with one query per table and batch, and the
+    shows double booking a venue are rejected. A dry run does all of it
+    and rolls back at the end. progress(result) is called after each
+    batch. Returns the ImportResult and the ids of the venues and
+    artists whose shows changed.
+    '''
+    model, columns, required = IMPORTS[entity]
+    result = ImportResult()
+    changed = {Venue: set(), Artist: set()}
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        # A DBAPI cursor on the same connection, for copy_expert
+        cursor = connection.connection.cursor()
+        try:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                rows = _prepare(batch, columns, required, result)
+                if model is Shows and rows:
+                    rows = _check_references(cursor, rows, result)
+                    lock_venue_bookings({row[1] for _, row in rows}, connection)
+                    rows = _check_bookings(cursor, rows, result)
+                    changed[Artist].update(row[0] for _, row in rows)
+                    changed[Venue].update(row[1] for _, row in rows)
+                if rows:
+                    _copy(cursor, model, columns, rows)
+                    result.imported += len(rows)
+                if progress is not None:
+                    progress(result)
+            # COPY bypasses the Shows mapper events maintaining the counters
+            for counted, ids in changed.items():
+                if ids:
+                    refresh_show_counters(connection, counted, ids)
+            if dry_run:
+                transaction.rollback()
+            else:
+                transaction.commit()
+        except Exception:
+            transaction.rollback()
+            raise
+        finally:
+            cursor.close()
+    return result, changed
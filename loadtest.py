@@ -0,0 +1,217 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import http.client
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+from models import app, db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Latency histogram.
+#----------------------------------------------------------------------------#
+
+
+class LatencyHistogram(object):
+    '''HDR style histogram of latencies in microseconds.
+
+    Values are counted in buckets whose width grows with the value, so
+    any latency is recorded with SIGNIFICANT_BITS of precision (under 1%
+    error) in a few hundred buckets, whatever the range.
+    '''
+    SIGNIFICANT_BITS = 7
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+    def _bucket(self, value):
+        shift = max(0, value.bit_length() - self.SIGNIFICANT_BITS)
+        return shift, value >> shift
+
+    def record(self, seconds):
+        value = max(1, int(seconds * 1000000))
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        '''Highest value (seconds) of the bucket holding the percentile.'''
+        if not self.total:
+            return 0.0
+        wanted = max(1, percent / 100 * self.total)
+        seen = 0
+        for (shift, sub), count in sorted(self.counts.items(),
+                                          key=lambda item: item[0][1] << item[0][0]):
+            seen += count
+            if seen >= wanted:
+                return min(((sub + 1) << shift) - 1, self.max) / 1000000
+        return self.max / 1000000
+
+#----------------------------------------------------------------------------#
+# Request mix.
+#----------------------------------------------------------------------------#
+
+# name -> default weight in the mix
+DEFAULT_MIX = {
+    'listing': 40,
+    'detail': 35,
+    'search': 15,
+    'create': 10,
+}
+
+LISTING_URLS = ['/venues', '/artists', '/shows']
+SEARCH_TERMS = ['the', 'band', 'hop', 'music', 'a', 'golden', 'cafe', 'club']
+
+
+def request_factory(rng, venue_ids, artist_ids):
+    '''Functions building a random (method, path, form data) per kind.'''
+    def listing():
+        return 'GET', rng.choice(LISTING_URLS), None
+
+    def detail():
+        if rng.random() < 0.5:
+            return 'GET', f'/venues/{rng.choice(venue_ids)}', None
+        return 'GET', f'/artists/{rng.choice(artist_ids)}', None
+
+    def search():
+        path = rng.choice(['/venues/search', '/artists/search'])
+        return 'POST', path, {'search_term': rng.choice(SEARCH_TERMS)}
+
+    def create():
+        start_time = datetime.now() + timedelta(days=rng.randint(1, 365),
+                                                hours=rng.randint(0, 23))
+        return 'POST', '/shows/create', {
+            'artist_id': rng.choice(artist_ids),
+            'venue_id': rng.choice(venue_ids),
+            'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    return {'listing': listing, 'detail': detail, 'search': search,
+            'create': create}
+
+#----------------------------------------------------------------------------#
+# Clients.
+#----------------------------------------------------------------------------#
+
+
+class WSGIClient(object):
+    '''Sends requests straight to the app, without any network.'''
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def send(self, method, path, data):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class HTTPClient(object):
+    '''Sends requests to a running server over a kept-alive connection.'''
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection \
+            if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.netloc, timeout=60)
+        self.prefix = url.path.rstrip('/')
+
+    def send(self, method, path, data):
+        body = urlencode(data) if data is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data else {}
+        try:
+            self.connection.request(method, self.prefix + path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request
+            self.connection.close()
+            raise
+        if response.will_close:
+            self.connection.close()
+        return response.status
+
+
+class LoadResult(object):
+
+    def __init__(self, mix):
+        self.latency = LatencyHistogram()
+        self.by_kind = {kind: LatencyHistogram() for kind in mix}
+        self.errors = {kind: 0 for kind in mix}
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return self.latency.total / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        for kind, histogram in other.by_kind.items():
+            self.by_kind[kind].merge(histogram)
+            self.errors[kind] += other.errors[kind]
+
+
+def run_load(clients=10, duration=30, mix=None, base_url=None, seed=0):
+    '''Drive the app with a weighted request mix from concurrent clients.
+
+    Each client is a thread sending its next request as soon as the
+    previous one is answered, for duration seconds. Requests go through
+    the WSGI app in this process, or to base_url (e.g. a gunicorn
+    server) when given. Create requests add shows to the database.
+    Returns a LoadResult; status codes of 400 and up count as errors.
+    '''
+    mix = {kind: weight for kind, weight in (mix or DEFAULT_MIX).items() if weight}
+    venue_ids = [id for id, in db.session.query(Venue.id).limit(1000)]
+    artist_ids = [id for id, in db.session.query(Artist.id).limit(1000)]
+    db.session.remove()
+    if not venue_ids or not artist_ids:
+        raise ValueError('Load testing needs venues and artists, seed them first')
+
+    result = LoadResult(mix)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(number):
+        rng = random.Random(seed + number)
+        factories = request_factory(rng, venue_ids, artist_ids)
+        kinds, weights = list(mix), list(mix.values())
+        sender = HTTPClient(base_url) if base_url else WSGIClient()
+        local = LoadResult(mix)
+        while time.monotonic() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            method, path, data = factories[kind]()
+            started = time.perf_counter()
+            try:
+                status = sender.send(method, path, data)
+            except (OSError, http.client.HTTPException):
+                status = None
+            elapsed = time.perf_counter() - started
+            local.latency.record(elapsed)
+            local.by_kind[kind].record(elapsed)
+            if status is None or status >= 400:
+                local.errors[kind] += 1
+        with lock:
+            result.merge(local)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(number,), daemon=True)
+               for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,200 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import defaultdict
+from flask import Response, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import app
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+
+class Histogram(object):
+    '''Cumulative histogram of observations, per set of label values.'''
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        # label values -> [count per bucket..., count, sum]
+        self._series = defaultdict(lambda: [0] * (len(self.buckets) + 1) + [0.0])
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series[label_values]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, counts in series:
+            labels = _labels(self.labels, label_values)
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le=bound)} {count}')
+            lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, le="+Inf")} {counts[-2]}')
+            lines.append(f'{self.name}_count{labels} {counts[-2]}')
+            lines.append(f'{self.name}_sum{labels} {counts[-1]}')
+        return lines
+
+
+class Counter(object):
+    '''Monotonic counter, per set of label values.'''
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} counter']
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+buckets = app.config['METRICS_BUCKETS']
+request_duration = Histogram(
+    'fyyur_request_duration_seconds', 'Time spent handling a request.',
+    ('endpoint', 'method'), buckets)
+request_db_duration = Histogram(
+    'fyyur_request_db_duration_seconds', 'Time spent running SQL per request.',
+    ('endpoint', 'method'), buckets)
+template_duration = Histogram(
+    'fyyur_template_render_seconds', 'Time spent rendering a template.',
+    ('template',), buckets)
+requests_total = Counter(
+    'fyyur_requests_total', 'Requests handled.',
+    ('endpoint', 'method', 'status'))
+sql_statements_total = Counter(
+    'fyyur_sql_statements_total', 'SQL statements run while handling requests.',
+    ('endpoint', 'method'))
+
+METRICS = (request_duration, request_db_duration, template_duration,
+           requests_total, sql_statements_total)
+
+#----------------------------------------------------------------------------#
+# Instrumentation.
+#----------------------------------------------------------------------------#
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which a failed statement discards.
+    # Only the dialect's own setup queries run without one.
+    if context is not None:
+        context.statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not hasattr(context, 'statement_started'):
+        return
+    elapsed = time.perf_counter() - context.statement_started
+    if has_request_context() and 'request_started' in g:
+        g.sql_statements += 1
+        g.db_time += elapsed
+
+
+class TimedTemplate(Template):
+    '''Template recording how long render() takes.
+
+    Streamed templates render while the response is sent, interleaved
+    with their queries, so they only count in the request duration.
+    '''
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            template_duration.observe(elapsed, self.name)
+            if has_request_context() and 'request_started' in g:
+                g.render_time += elapsed
+
+
+app.jinja_env.template_class = TimedTemplate
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_statements = 0
+    g.db_time = 0.0
+    g.render_time = 0.0
+
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    # Teardown runs once a streamed response is fully sent, so its
+    # queries and rendering are included
+    if 'request_started' not in g:
+        return
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if error is not None else g.get('response_status', 500)
+    request_duration.observe(elapsed, endpoint, request.method)
+    request_db_duration.observe(g.db_time, endpoint, request.method)
+    requests_total.inc(1, endpoint, request.method, status)
+    sql_statements_total.inc(g.sql_statements, endpoint, request.method)
+    if elapsed >= app.config['SLOW_REQUEST_THRESHOLD']:
+        app.logger.warning(
+            'Slow request: %s %s took %.3fs (%d SQL statements in %.3fs, '
+            'templates %.3fs)', request.method, request.full_path.rstrip('?'),
+            elapsed, g.sql_statements, g.db_time, g.render_time)
+    del g.request_started
+
+#----------------------------------------------------------------------------#
+# Endpoint.
+#----------------------------------------------------------------------------#
+
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format; every worker process keeps its own metrics
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.exposition())
+    return Response('\n'.join(lines) + '\n',
+                    mimetype='text/plain; version=0.0.4')
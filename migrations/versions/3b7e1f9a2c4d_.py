@@ -0,0 +1,32 @@
+"""empty message
+
+Revision ID: 3b7e1f9a2c4d
+Revises: ef809d6884a3
+Create Date: 2026-10-18 10:05:12.418903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e1f9a2c4d'
+down_revision = 'ef809d6884a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trigram GIN indexes so name ILIKE '%term%' searches avoid a full scan
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'], unique=False,
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
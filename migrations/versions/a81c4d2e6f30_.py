@@ -0,0 +1,48 @@
+"""empty message
+
+Revision ID: a81c4d2e6f30
+Revises: 3b7e1f9a2c4d
+Create Date: 2026-10-18 10:41:37.205118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81c4d2e6f30'
+down_revision = '3b7e1f9a2c4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, foreign_key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(),
+                                       nullable=True))
+        op.create_index(op.f(f'ix_{table}_next_show_time'), table,
+                        ['next_show_time'], unique=False)
+        # Backfill the counters from the existing shows
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = counts.upcoming_shows_count,
+                next_show_time = counts.next_show_time
+            FROM (
+                SELECT {foreign_key} AS id,
+                       count(*) AS upcoming_shows_count,
+                       min(start_time) AS next_show_time
+                FROM shows
+                WHERE start_time > now()
+                GROUP BY {foreign_key}
+            ) AS counts
+            WHERE "{table}".id = counts.id
+        ''')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(op.f(f'ix_{table}_next_show_time'), table_name=table)
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,105 @@
+"""empty message
+
+Revision ID: e5f1a7c3d820
+Revises: b93e6c27f1a8
+Create Date: 2026-10-18 16:27:40.381955
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f1a7c3d820'
+down_revision = 'b93e6c27f1a8'
+branch_labels = None
+depends_on = None
+
+# Months partitioned ahead of today; later ones go to shows_default
+# until `flask partitions create` adds them
+MONTHS_AHEAD = 12
+
+PERIOD = "tsrange(start_time, start_time + duration * interval '1 minute')"
+EXCLUSION = ("ALTER TABLE {name} ADD CONSTRAINT {name}_venue_id_period_excl "
+             "EXCLUDE USING gist (int4range(venue_id, venue_id, '[]') WITH =, "
+             f"{PERIOD} WITH &&)")
+COLUMNS = 'id, artist_id, venue_id, start_time, duration'
+
+
+def _months(first, last):
+    month = datetime(first.year, first.month, 1)
+    while month <= last:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        yield month, following
+        month = following
+
+
+def _create_table(primary_key, **kwargs):
+    op.create_table('shows',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('shows_id_seq'::regclass)"), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('duration', sa.Integer(), server_default='120', nullable=False),
+    sa.CheckConstraint('duration > 0', name='ck_shows_duration_positive'),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint(*primary_key),
+    **kwargs
+    )
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index(op.f('ix_shows_start_time'), 'shows', ['start_time'], unique=False)
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+
+
+def _set_aside(name):
+    # Free the names the new shows table takes; the sequence outlives
+    # the table it belongs to
+    op.execute(f'ALTER TABLE shows RENAME TO {name}')
+    op.execute(f'ALTER TABLE {name} RENAME CONSTRAINT shows_pkey TO {name}_pkey')
+    op.execute(f'ALTER TABLE {name} DROP CONSTRAINT shows_artist_id_fkey, '
+               'DROP CONSTRAINT shows_venue_id_fkey')
+    for index in ('ix_shows_artist_id_start_time', 'ix_shows_start_time',
+                  'ix_shows_venue_id_start_time'):
+        op.execute(f'DROP INDEX {index}')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+
+
+def upgrade():
+    bind = op.get_bind()
+    _set_aside('shows_unpartitioned')
+    # The partitioning key has to be part of the primary key
+    _create_table(('id', 'start_time'), postgresql_partition_by='RANGE (start_time)')
+
+    # A partition per month from the first show to MONTHS_AHEAD from
+    # now, and a default one for anything outside of them
+    now = datetime.now()
+    first, last = bind.execute(sa.text(
+        'SELECT min(start_time), max(start_time) FROM shows_unpartitioned')).first()
+    ahead = datetime(now.year + (now.month + MONTHS_AHEAD - 1) // 12,
+                     (now.month + MONTHS_AHEAD - 1) % 12 + 1, 1)
+    partitions = ['shows_default']
+    for month, following in _months(min(first or now, now), max(last or now, ahead)):
+        name = f'shows_{month:%Y_%m}'
+        op.execute(f"CREATE TABLE {name} PARTITION OF shows FOR VALUES "
+                   f"FROM ('{month.isoformat()}') TO ('{following.isoformat()}')")
+        partitions.append(name)
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+
+    op.execute(f'INSERT INTO shows ({COLUMNS}) SELECT {COLUMNS} FROM shows_unpartitioned')
+    # Built once the rows are in, which is much faster than row by row
+    for name in partitions:
+        op.execute(EXCLUSION.format(name=name))
+    op.drop_table('shows_unpartitioned')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+
+
+def downgrade():
+    # Shows of detached partitions are not brought back
+    _set_aside('shows_partitioned')
+    _create_table(('id',))
+    op.execute(f'INSERT INTO shows ({COLUMNS}) SELECT {COLUMNS} FROM shows_partitioned')
+    op.execute(EXCLUSION.format(name='shows'))
+    op.drop_table('shows_partitioned')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
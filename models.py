@@ -5,11 +5,16 @@
 import json
 import dateutil.parser
 import babel
+import babel.dates
 from flask import Flask
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import values
+from sqlalchemy.dialects.postgresql import ARRAY
 from datetime import datetime
+from functools import lru_cache
+from forms import GENERE_CHOICES, DEFAULT_SHOW_DURATION
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -18,8 +23,16 @@ from datetime import datetime
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = RoutingSQLAlchemy(app)
+
+
+def _include_object(object, name, type_, reflected, compare_to):
+    # The partitions of shows are managed by partitions.py, not migrations
+    from partitions import is_partition
+    return not (type_ == 'table' and reflected and is_partition(name))
+
+
+migrate = Migrate(app, db, include_object=_include_object)
 
 # Done: connect to a local postgresql database
 
@@ -28,18 +41,136 @@ migrate = Migrate(app, db)
 #----------------------------------------------------------------------------#
 
 
+ONE_MINUTE = db.literal_column("interval '1 minute'")
+
+
+def show_period(start_time, duration):
+    '''The [start, end) range a show books its venue for.'''
+    return db.func.tsrange(start_time, start_time + duration * ONE_MINUTE)
+
+
+def venue_slot(venue_id):
+    '''The venue id as a one value range.
+
+    Ranges have a GiST operator class built in, integers only get one
+    from the btree_gist extension; this keeps the constraint below to
+    core PostgreSQL.
+    '''
+    return db.func.int4range(venue_id, venue_id, '[]')
+
+
 class Shows(db.Model):
     __tablename__ = 'shows'
-    id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey(
-        'Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False,
-                           default=datetime.utcnow)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # active_history: the old ids are loaded when changed, for the show
+    # counters of a moved show (see _recount_changed_show)
+    artist_id = db.column_property(db.Column(db.Integer, db.ForeignKey(
+        'Artist.id'), nullable=False), active_history=True)
+    venue_id = db.column_property(db.Column(
+        db.Integer, db.ForeignKey('Venue.id'), nullable=False), active_history=True)
+    # Partition key, so part of the table's primary key (see partitions.py)
+    start_time = db.Column(db.DateTime, primary_key=True,
+                           default=datetime.utcnow, index=True)
+    # Minutes the show books the venue for
+    duration = db.Column(db.Integer, nullable=False,
+                         default=DEFAULT_SHOW_DURATION,
+                         server_default=str(DEFAULT_SHOW_DURATION))
+
+    __table_args__ = (
+        # Shows of a venue / an artist split into past and upcoming
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        # No two shows of a venue overlap: an exclusion constraint on
+        # each partition, whose GiST index also finds the conflicts of a
+        # booking (see partitions.EXCLUSION and venue_conflicts())
+        db.CheckConstraint('duration > 0', name='ck_shows_duration_positive'),
+        {'postgresql_partition_by': 'RANGE (start_time)'},
+    )
+    # Shows are still identified by id alone. The database cannot keep
+    # it unique across partitions (unique indexes must include
+    # start_time), so ids only ever come from the shows_id_seq sequence,
+    # see _check_show_id()
+    __mapper_args__ = {'primary_key': [id]}
+
+
+@db.event.listens_for(Shows, 'before_insert')
+def _check_show_id(mapper, connection, target):
+    if target.id is not None:
+        raise ValueError('Show ids are assigned by the database, '
+                         'an explicit one could duplicate an existing show')
+
+
+# SQLSTATE of a row violating an exclusion constraint
+EXCLUSION_VIOLATION = '23P01'
+
+
+# Advisory lock space of the venue bookings, see lock_venue_bookings()
+BOOKING_LOCK = 23
+# Venues share this many locks, so a transaction booking shows at
+# thousands of venues (an import) stays within the server's lock table
+BOOKING_LOCK_SLOTS = 1024
+
+
+def lock_venue_bookings(venue_ids, connection=None):
+    '''Serialize the bookings of the venues until the transaction ends.
+
+    The exclusion constraint of a partition does not see the shows of
+    the others, so a show running past midnight at the end of a month
+    could be double booked. Checking venue_conflicts() and inserting
+    while holding this lock closes that gap, on every path adding shows
+    (the forms and bulk imports). Runs on the session unless given a
+    connection.
+    '''
+    slots = sorted({int(venue_id) % BOOKING_LOCK_SLOTS for venue_id in venue_ids})
+    slot = db.func.unnest(db.cast(slots, ARRAY(db.Integer))).label('slot')
+    slots = db.select([slot]).order_by('slot').subquery()
+    # Taken in slot order, so two bookings cannot deadlock
+    (connection or db.session).execute(db.select([db.func.count(
+        db.func.pg_advisory_xact_lock(BOOKING_LOCK, slots.c.slot))]))
+
+
+def venue_conflicts(venue_id, start_time, duration):
+    '''Query of the shows of a venue overlapping a booking.'''
+    # Same expressions as the constraints, so their indexes are used
+    return Shows.query.filter(
+        venue_slot(Shows.venue_id) == venue_slot(venue_id),
+        show_period(Shows.start_time, Shows.duration).op('&&')(
+            show_period(start_time, duration)))
+
+
+def lineup_conflicts(shows):
+    '''Query of the shows overlapping any show dict of a lineup.'''
+    lineup = values(
+        db.column('venue_id', db.Integer), db.column('start_time', db.DateTime),
+        db.column('duration', db.Integer), name='lineup'
+    ).data([(show['venue_id'], show['start_time'], show['duration'])
+            for show in shows])
+    return Shows.query.join(lineup, db.and_(
+        venue_slot(Shows.venue_id) == venue_slot(lineup.c.venue_id),
+        show_period(Shows.start_time, Shows.duration).op('&&')(
+            show_period(lineup.c.start_time, lineup.c.duration))))
+
+
+def is_booking_conflict(error):
+    '''Whether a database error is a venue double booking.'''
+    # SQLAlchemy wraps the DBAPI error, raw cursors (e.g. COPY) do not
+    error = getattr(error, 'orig', error)
+    return getattr(error, 'pgcode', None) == EXCLUSION_VIOLATION
 
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # Trigram index serving the case-insensitive substring search
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Keyset pagination of /venues and of /api/v1/venues, which seek
+        # to their cursor and read a page in order
+        db.Index('ix_Venue_city_state_name_id', 'city', 'state', 'name', 'id'),
+        db.Index('ix_Venue_name_id', 'name', 'id'),
+        # Genre filter of the listings (genres @> the selected genres)
+        db.Index('ix_Venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -49,25 +180,46 @@ class Venue(db.Model):
     phone = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()), nullable=False)
+    genres = db.Column(ARRAY(db.String()), nullable=False)
+    # The genres as bits of GENRE_BITS, kept in sync by the events below,
+    # for the genre counts of the facets
+    genre_mask = db.Column(db.Integer, nullable=False,
+                           default=0, server_default='0')
     website = db.Column(db.String(250))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(250))
     shows = db.relationship('Shows', backref="venue",
                             lazy=True, cascade="all, delete")
+    # Maintained by the Shows mapper events below, see refresh_show_counters
+    upcoming_shows_count = db.Column(db.Integer, nullable=False,
+                                     default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
 
     # Done: implement any missing fields, as a database migration using Flask-Migrate
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # Trigram index serving the case-insensitive substring search
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Keyset pagination of /artists and of /api/v1/artists
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        # Genre filter of the listings (genres @> the selected genres)
+        db.Index('ix_Artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String()), nullable=False)
+    genres = db.Column(ARRAY(db.String()), nullable=False)
+    # The genres as bits of GENRE_BITS, kept in sync by the events below,
+    # for the genre counts of the facets
+    genre_mask = db.Column(db.Integer, nullable=False,
+                           default=0, server_default='0')
     website = db.Column(db.String(250))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
@@ -75,23 +227,118 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(250))
     shows = db.relationship('Shows', backref="artist",
                             lazy=True, cascade="all, delete")
+    # Maintained by the Shows mapper events below, see refresh_show_counters
+    upcoming_shows_count = db.Column(db.Integer, nullable=False,
+                                     default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
 
     # Done: implement any missing fields, as a database migration using Flask-Migrate
 
 # Done Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+#----------------------------------------------------------------------------#
+# Genre masks.
+#----------------------------------------------------------------------------#
+
+# Bit of each genre, in the order of GENERE_CHOICES. Stored masks depend
+# on it: only ever append new genres to the choices.
+GENRE_BITS = {genre: 1 << bit for bit, (genre, label) in enumerate(GENERE_CHOICES)}
+
+
+def genre_mask(genres):
+    '''Encode genres as a bitmask, ignoring genres outside the choices.'''
+    mask = 0
+    for genre in genres or ():
+        mask |= GENRE_BITS.get(genre, 0)
+    return mask
+
+
+@db.event.listens_for(Venue, 'before_insert')
+@db.event.listens_for(Venue, 'before_update')
+@db.event.listens_for(Artist, 'before_insert')
+@db.event.listens_for(Artist, 'before_update')
+def _update_genre_mask(mapper, connection, target):
+    target.genre_mask = genre_mask(target.genres)
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+
+def refresh_show_counters(connection, model, ids=None, now=None):
+    '''Recompute upcoming_shows_count and next_show_time of model rows.
+
+    Only the rows with the given ids are refreshed, or the rows whose
+    next show has started if no ids are given (see sweep_show_counters).
+    '''
+    now = now or datetime.now()
+    table = model.__table__
+    foreign_key = Shows.venue_id if model is Venue else Shows.artist_id
+    upcoming = db.and_(foreign_key == table.c.id, Shows.start_time > now)
+    statement = table.update().values(
+        upcoming_shows_count=db.select([db.func.count(Shows.id)]
+                                       ).where(upcoming).scalar_subquery(),
+        next_show_time=db.select([db.func.min(Shows.start_time)]
+                                 ).where(upcoming).scalar_subquery()
+    )
+    if ids is None:
+        statement = statement.where(table.c.next_show_time <= now)
+    else:
+        statement = statement.where(table.c.id.in_(list(ids)))
+    return connection.execute(statement).rowcount
+
+
+def sweep_show_counters(connection, now=None):
+    '''Move the shows that have started out of the upcoming counters.'''
+    return sum(refresh_show_counters(connection, model, now=now)
+               for model in (Venue, Artist))
+
+
+@db.event.listens_for(Shows, 'after_insert')
+def _count_inserted_show(mapper, connection, show):
+    if show.start_time > datetime.now():
+        for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+            table = model.__table__
+            connection.execute(table.update().where(table.c.id == id).values(
+                upcoming_shows_count=table.c.upcoming_shows_count + 1,
+                next_show_time=db.func.least(table.c.next_show_time,
+                                             show.start_time)
+            ))
+
+
+@db.event.listens_for(Shows, 'after_update')
+@db.event.listens_for(Shows, 'after_delete')
+def _recount_changed_show(mapper, connection, show):
+    # Refresh both the old and new venue/artist of a moved show
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        history = db.inspect(show).attrs[key].history
+        ids = set(history.deleted or ()) | {getattr(show, key)}
+        refresh_show_counters(connection, model, ids)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
+# Patterns of the named formats, parsed once instead of on every call
+DATETIME_PATTERNS = {
+    'full': babel.dates.parse_pattern("EEEE MMMM, d, y 'at' h:mma"),
+    'medium': babel.dates.parse_pattern("EE MM, dd, y h:mma"),
+}
+DATETIME_LOCALE = babel.Locale.parse(babel.dates.LC_TIME)
+
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format):
+    pattern = DATETIME_PATTERNS.get(format) or babel.dates.parse_pattern(format)
+    return pattern.apply(value, DATETIME_LOCALE)
+
+
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+    # Routes pass datetimes, only parse values that come in as strings
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return _format_datetime(value, format)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
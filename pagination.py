@@ -0,0 +1,145 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# items: rows of the current page
+# next_cursor / prev_cursor: opaque tokens for the neighbour pages (or None)
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor', 'per_page'])
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    raise TypeError(f'Cannot encode {value!r} in a cursor')
+
+
+def _decode_value(obj):
+    if 'dt' in obj:
+        return datetime.fromisoformat(obj['dt'])
+    return obj
+
+
+def encode_cursor(values):
+    '''Turn the sort key of a row into an url safe token.'''
+    raw = json.dumps(list(values), default=_encode_value,
+                     separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+# Range of the int4 columns, larger ids would fail in PostgreSQL
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _matches(value, column):
+    python_type = column.type.python_type
+    if python_type is int:
+        return type(value) is int and INT4_MIN <= value <= INT4_MAX
+    if python_type is str:
+        return isinstance(value, str) and '\x00' not in value
+    if python_type is datetime:
+        return isinstance(value, datetime) and value.tzinfo is None
+    return isinstance(value, python_type)
+
+
+def decode_cursor(token, columns):
+    '''Turn a token back into a sort key of columns, None without token.
+
+    Raises ValueError when the token is not a cursor of these columns,
+    so a crafted one never reaches the database.
+    '''
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw, object_hook=_decode_value)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid page cursor')
+    if not isinstance(values, list) or len(values) != len(columns) or \
+            not all(_matches(value, column) for value, column in zip(values, columns)):
+        raise ValueError('Invalid page cursor')
+    return values
+
+
+def get_page_size():
+    '''Read ?per_page= from the request, clamped to MAX_PAGE_SIZE.'''
+    default = current_app.config['PAGE_SIZE']
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+
+# Position of a page in the sort order, as read from the request
+Window = namedtuple('Window', ['columns', 'per_page', 'after', 'before'])
+
+
+def page_query(query, *columns):
+    '''Restrict query to the page asked for by the request.
+
+    Works on a Query or a select(), and returns it with the Window
+    make_page needs to turn the fetched rows into a Page. Raises
+    ValueError on an invalid ?after= / ?before= cursor.
+    '''
+    per_page = get_page_size()
+    after = decode_cursor(request.args.get('after'), columns)
+    before = decode_cursor(request.args.get('before'), columns)
+    key = tuple_(*columns)
+
+    if before is not None:
+        # Walk backwards from the cursor, make_page restores the order
+        query = query.filter(key < tuple_(*before)
+                             ).order_by(*[column.desc() for column in columns])
+        after = None
+    else:
+        if after is not None:
+            query = query.filter(key > tuple_(*after))
+        query = query.order_by(*columns)
+        before = None
+    return query.limit(per_page + 1), Window(columns, per_page, after, before)
+
+
+def make_page(rows, window):
+    '''Turn the rows fetched for a page_query into a Page.'''
+    per_page = window.per_page
+    if window.before is not None:
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        has_prev, has_next = window.after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    def cursor(row):
+        return encode_cursor(getattr(row, column.key) for column in window.columns)
+
+    return Page(
+        items=rows,
+        next_cursor=cursor(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor(rows[0]) if rows and has_prev else None,
+        per_page=per_page
+    )
+
+
+def paginate(query, *columns):
+    '''Return a Page of query ordered by columns.
+
+    The columns must form a unique sort key (e.g. name, id) and be
+    selected by the query under their own key. The page position comes
+    from the ?after= / ?before= cursors of the request, and is applied
+    as a row comparison in the WHERE clause, so the database can seek
+    straight to it on an index instead of skipping OFFSET rows. An
+    invalid cursor is a 400.
+    '''
+    try:
+        query, window = page_query(query, *columns)
+    except ValueError as error:
+        abort(400, str(error))
+    return make_page(query.all(), window)
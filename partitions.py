@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import datetime
+from models import Shows
+
+#----------------------------------------------------------------------------#
+# Monthly partitions of the shows table.
+#
+# shows is range partitioned on start_time, one partition per month,
+# named shows_YYYY_MM, plus shows_default for the shows of months that
+# have no partition yet. Queries bounded on start_time (the upcoming
+# shows, the calendar) only read the partitions of their months, and a
+# month of past shows is detached as a plain table in one statement.
+#----------------------------------------------------------------------------#
+
+PARENT = Shows.__tablename__
+DEFAULT_PARTITION = f'{PARENT}_default'
+PARTITION_NAME = re.compile(rf'{PARENT}_(\d{{4}})_(\d{{2}})$')
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# PostgreSQL only enforces an exclusion constraint within a partition,
+# so every partition gets its own. The booking paths also check across
+# partitions under a lock, see models.lock_venue_bookings().
+EXCLUSION = ("ALTER TABLE {name} ADD CONSTRAINT {name}_venue_id_period_excl "
+             "EXCLUDE USING gist (int4range(venue_id, venue_id, '[]') WITH =, "
+             "tsrange(start_time, start_time + duration * interval '1 minute') WITH &&)")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT}_{month:%Y_%m}'
+
+
+def is_partition(name):
+    '''Whether a table name is one of a (possibly detached) partition.'''
+    return name == DEFAULT_PARTITION or PARTITION_NAME.match(name) is not None
+
+
+def list_partitions(connection):
+    '''Return (name, start, end, estimated rows, bytes) of each partition.
+
+    start and end are None for the default partition, which comes last.
+    '''
+    rows = connection.execute(f'''
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid),
+               child.reltuples::bigint, pg_total_relation_size(child.oid)
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = '{PARENT}'
+    ''').fetchall()
+    partitions = []
+    for name, bound, estimated_rows, size in rows:
+        match = BOUNDS.search(bound)
+        start, end = (datetime.fromisoformat(match.group(1)),
+                      datetime.fromisoformat(match.group(2))) if match else (None, None)
+        # reltuples is -1 until the partition is first analyzed
+        partitions.append((name, start, end, max(estimated_rows, 0), size))
+    return sorted(partitions, key=lambda partition: (partition[1] is None,
+                                                     partition[1] or datetime.min))
+
+
+def empty_partitions(connection):
+    '''Return the names of the partitions holding no rows at all.
+
+    relpages and reltuples only catch up on VACUUM or ANALYZE, so a
+    partition filled since reads as empty from them: the size of its
+    table file tells.
+    '''
+    rows = connection.execute(f'''
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = '{PARENT}'
+          AND child.relpages = 0 AND pg_relation_size(child.oid) = 0
+    ''').fetchall()
+    return {name for name, in rows}
+
+
+def create_partition(connection, month):
+    '''Create and attach the partition of the month starting at month.
+
+    Shows of the month already stored in the default partition move to
+    the new one. The table is filled and constrained before it is
+    attached, so shows stays readable meanwhile.
+    '''
+    name, end = partition_name(month), next_month(month)
+    bounds = f"start_time >= '{month.isoformat()}' AND start_time < '{end.isoformat()}'"
+    connection.execute(f'CREATE TABLE {name} (LIKE {PARENT} '
+                       'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    connection.execute(f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {bounds} '
+                       f'RETURNING *) INSERT INTO {name} SELECT * FROM moved')
+    connection.execute(EXCLUSION.format(name=name))
+    # Proves the partition bounds, so ATTACH does not scan the table
+    connection.execute(f'ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK ({bounds})')
+    connection.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES "
+                       f"FROM ('{month.isoformat()}') TO ('{end.isoformat()}')")
+    connection.execute(f'ALTER TABLE {name} DROP CONSTRAINT {name}_bounds')
+    return name
+
+
+def create_partitions(connection, start, end):
+    '''Create the missing partitions of the months from start to end.'''
+    existing = {name for name, *_ in list_partitions(connection)}
+    created = []
+    month = month_start(start)
+    while month <= end:
+        if partition_name(month) not in existing:
+            created.append(create_partition(connection, month))
+        month = next_month(month)
+    return created
+
+
+def create_partitions_ahead(connection, months, now=None):
+    '''Create the missing partitions of this month and the next months.'''
+    start = end = month_start(now or datetime.now())
+    for _ in range(months):
+        end = next_month(end)
+    return create_partitions(connection, start, end)
+
+
+def detach_partitions(connection, before, drop=False):
+    '''Detach the partitions of the months before the one of before.
+
+    Detached partitions stay as plain tables, e.g. to archive them with
+    pg_dump, unless drop is set. Only past months can be detached, so
+    the upcoming show counters stay right.
+    '''
+    before = month_start(before)
+    if before > month_start(datetime.now()):
+        raise ValueError('Only the months before the current one can be detached')
+    detached = []
+    for name, start, end, _, _ in list_partitions(connection):
+        if end is not None and end <= before:
+            connection.execute(f'ALTER TABLE {PARENT} DETACH PARTITION {name}')
+            if drop:
+                connection.execute(f'DROP TABLE {name}')
+            detached.append(name)
+    return detached
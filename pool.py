@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool statistics.
+#----------------------------------------------------------------------------#
+
+
+class TimedQueuePool(QueuePool):
+    '''QueuePool also measuring how long checkouts wait for a connection.
+
+    The wait includes opening a new connection when the pool has none
+    idle, so a high average points at either an undersized pool or a
+    slow database server.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+
+
+def pool_stats(engine):
+    '''Describe the connection pool of an engine.'''
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # Connections open beyond size, negative while the pool fills
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                "checkouts": pool.checkouts,
+                "timeouts": pool.timeouts,
+                "wait_time": round(pool.wait_time, 6),
+                "avg_wait_time": round(pool.wait_time / pool.checkouts, 6)
+                if pool.checkouts else 0.0,
+                "max_wait_time": round(pool.max_wait_time, 6),
+            })
+    return stats
@@ -0,0 +1,481 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from operator import attrgetter
+from flask import current_app, abort, request, url_for
+from sqlalchemy import func, tuple_
+from models import db, Venue, Artist, Shows, GENRE_BITS
+from pagination import INT4_MAX
+
+#----------------------------------------------------------------------------#
+# Queries shared by the HTML pages and the JSON API.
+#----------------------------------------------------------------------------#
+
+
+def listing_filters():
+    '''Read the listing filters from ?genre= (repeatable, all of them must
+    match), ?state= and ?city=.'''
+    return {
+        "genres": sorted({genre for genre in request.args.getlist('genre')
+                          if genre in GENRE_BITS}),
+        "state": request.args.get('state') or None,
+        "city": request.args.get('city') or None,
+    }
+
+
+def filter_listing(query, model, filters):
+    if filters["genres"]:
+        # Every selected genre is listed, served by the GIN index on genres
+        query = query.filter(model.genres.contains(filters["genres"]))
+    if filters["state"]:
+        query = query.filter(model.state == filters["state"])
+    if filters["city"]:
+        query = query.filter(model.city == filters["city"])
+    return query
+
+
+# grouping() of the facet query rows, telling the grouping sets apart
+TOTAL_FACET, STATE_FACET, CITY_FACET = 0b11, 0b01, 0b00
+
+
+def facet_query(model, filters):
+    '''Count the filtered venues or artists per genre, state and city.
+
+    One grouped query over the filtered rows, with a grouping set per
+    facet. The genre counts are sums of (genre_mask & bit) <> 0 over
+    all the rows, in the row of the empty grouping set.
+    '''
+    genre_counts = [func.count().filter(model.genre_mask.op('&')(bit) != 0
+                                        ).label(f'genre_{index}')
+                    for index, bit in enumerate(GENRE_BITS.values())]
+    query = db.session.query(
+        model.state,
+        model.city,
+        func.grouping(model.state, model.city).label('facet'),
+        func.count().label('count'),
+        *genre_counts
+    )
+    return filter_listing(query, model, filters).group_by(func.grouping_sets(
+        tuple_(), tuple_(model.state), tuple_(model.state, model.city)))
+
+
+def facet_links(rows, filters):
+    '''Turn the facet_query rows into the counts and links of the listing.
+
+    A genre link adds the genre to the filters (or removes it when it is
+    already one); a state or city link selects it. Links go back to the
+    first page.
+    '''
+    def link(**changes):
+        args = dict(filters, **changes)
+        return url_for(request.endpoint, genre=args["genres"], state=args["state"],
+                       city=args["city"], per_page=request.args.get('per_page'))
+
+    facets = {"genres": [], "states": [], "cities": []}
+    for row in sorted(rows, key=lambda row: (-row.count, row.state or '',
+                                             row.city or '')):
+        if row.facet == TOTAL_FACET:
+            for index, genre in enumerate(GENRE_BITS):
+                count = getattr(row, f'genre_{index}')
+                if count:
+                    genres = sorted(set(filters["genres"]) ^ {genre})
+                    facets["genres"].append({
+                        "name": genre, "count": count,
+                        "active": genre in filters["genres"],
+                        "url": link(genres=genres)})
+            facets["genres"].sort(key=lambda facet: -facet["count"])
+        elif row.facet == STATE_FACET:
+            facets["states"].append({"name": row.state, "count": row.count,
+                                     "active": row.state == filters["state"],
+                                     "url": link(state=row.state, city=None)})
+        elif row.facet == CITY_FACET:
+            facets["cities"].append({"name": f'{row.city}, {row.state}',
+                                     "count": row.count,
+                                     "active": row.city == filters["city"],
+                                     "url": link(state=row.state, city=row.city)})
+    facets["filtered"] = any(filters.values())
+    facets["clear_url"] = link(genres=[], state=None, city=None)
+    return facets
+
+
+def venue_listing_query(filters):
+    '''Query of the /venues rows, to paginate on VENUE_LISTING_ORDER.'''
+    return filter_listing(db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.upcoming_shows_count.label('shows')
+    ), Venue, filters)
+
+
+# Ordered by area so venues of the same city and state come out
+# next to each other
+VENUE_LISTING_ORDER = (Venue.city, Venue.state, Venue.name, Venue.id)
+
+
+def venue_areas(venues):
+    '''Group rows of venue_listing_query by area, in a single pass.'''
+    return [{"city": city,
+             "state": state,
+             "venues": [{
+                 "id": venue.id,
+                 "name": venue.name,
+                 "num_upcoming_shows": venue.shows
+             } for venue in area_venues]}
+            for (city, state), area_venues in groupby(venues, key=attrgetter('city', 'state'))]
+
+
+def artist_listing_query(filters):
+    '''Query of the /artists rows, to paginate on ARTIST_LISTING_ORDER.'''
+    return filter_listing(db.session.query(
+        Artist.id,
+        Artist.name
+    ), Artist, filters)
+
+
+ARTIST_LISTING_ORDER = (Artist.name, Artist.id)
+
+
+def artist_listing(artists):
+    '''Turn rows of artist_listing_query into the /artists data objects.'''
+    return [{
+        "id": artist.id,
+        "name": artist.name
+    } for artist in artists]
+
+
+def escape_like(term):
+    '''Escape the LIKE wildcards of term, so it is matched literally.'''
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_query(model, search_term):
+    '''Query of the venues or artists whose name contains search_term.'''
+    # Filters with the trigram index on the name
+    return db.session.query(
+        model.id,
+        model.name,
+        model.upcoming_shows_count.label('shows')
+    ).filter(model.name.ilike(f'%{escape_like(search_term)}%', escape='\\')
+             ).order_by(model.name, model.id)
+
+
+def search_results(rows):
+    '''Turn the rows of a search_query into the search page data.'''
+    return {
+        "count": len(rows),
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.shows
+        } for row in rows]
+    }
+
+
+def venue_detail(venue_id, show_all=False):
+    '''Return the venue page data and the start time of its next show.'''
+    return venue_detail_data(venue_detail_query(venue_id, show_all).all())
+
+
+def _ranked_shows(foreign_key, id, now):
+    '''Subquery of the shows of a venue or an artist, each numbered in
+    start time order among the past or the upcoming ones, with the size
+    of its group.'''
+    upcoming = Shows.start_time > now
+    return db.session.query(
+        Shows.id,
+        Shows.venue_id,
+        Shows.artist_id,
+        Shows.start_time,
+        upcoming.label('upcoming'),
+        func.row_number().over(partition_by=upcoming,
+                               order_by=(Shows.start_time, Shows.id)).label('position'),
+        func.count().over(partition_by=upcoming).label('shows_count')
+    ).filter(foreign_key == id).subquery()
+
+
+def _listed(shows, show_all):
+    # Past shows are all listed, upcoming ones up to UPCOMING_SHOWS_LIMIT
+    # unless all were asked for
+    if show_all:
+        return db.true()
+    return db.or_(db.not_(shows.c.upcoming),
+                  shows.c.position <= current_app.config['UPCOMING_SHOWS_LIMIT'])
+
+
+def venue_detail_query(venue_id, show_all=False):
+    # Get the venue and its listed shows in one query, classifying each
+    # show as past or upcoming against the same timestamp. The show id
+    # keeps identical shows (same artist and time) apart.
+    shows = _ranked_shows(Shows.venue_id, venue_id, datetime.now())
+    return db.session.query(
+        Venue,
+        shows.c.id,
+        shows.c.artist_id,
+        Artist.name,
+        Artist.image_link,
+        shows.c.start_time,
+        shows.c.upcoming,
+        shows.c.shows_count
+    ).outerjoin(shows, db.and_(shows.c.venue_id == Venue.id, _listed(shows, show_all))
+                ).outerjoin(Artist, shows.c.artist_id == Artist.id
+                            ).filter(Venue.id == venue_id
+                                     ).order_by(shows.c.start_time, shows.c.id)
+
+
+def venue_detail_data(rows):
+    '''Turn the rows of venue_detail_query into the venue page data.'''
+    if not rows:
+        abort(404)
+    venue = rows[0].Venue
+    shows = [row for row in rows if row.start_time is not None]
+    upcoming_shows = [show for show in shows if show.upcoming]
+    past_shows = [show for show in reversed(shows) if not show.upcoming]
+
+    # Prepare the data object
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": [{
+            "artist_id": show.artist_id,
+            "artist_name": show.name,
+            "artist_image_link": show.image_link,
+            "start_time": show.start_time
+        } for show in past_shows],
+        "upcoming_shows": [{
+            "artist_id": show.artist_id,
+            "artist_name": show.name,
+            "artist_image_link": show.image_link,
+            "start_time": show.start_time
+        } for show in upcoming_shows],
+        "past_shows_count": len(past_shows),
+        # The query only returns the listed upcoming shows
+        "upcoming_shows_count": upcoming_shows[0].shows_count if upcoming_shows else 0,
+    }
+
+    next_show_time = upcoming_shows[0].start_time if upcoming_shows else None
+    return data, next_show_time
+
+
+def artist_detail(artist_id, show_all=False):
+    '''Return the artist page data and the start time of its next show.'''
+    return artist_detail_data(artist_detail_query(artist_id, show_all).all())
+
+
+def artist_detail_query(artist_id, show_all=False):
+    # Get the artist and its listed shows in one query, classifying each
+    # show as past or upcoming against the same timestamp
+    shows = _ranked_shows(Shows.artist_id, artist_id, datetime.now())
+    return db.session.query(
+        Artist,
+        shows.c.id,
+        shows.c.venue_id,
+        Venue.name,
+        Venue.image_link,
+        shows.c.start_time,
+        shows.c.upcoming,
+        shows.c.shows_count
+    ).outerjoin(shows, db.and_(shows.c.artist_id == Artist.id, _listed(shows, show_all))
+                ).outerjoin(Venue, shows.c.venue_id == Venue.id
+                            ).filter(Artist.id == artist_id
+                                     ).order_by(shows.c.start_time, shows.c.id)
+
+
+def artist_detail_data(rows):
+    '''Turn the rows of artist_detail_query into the artist page data.'''
+    if not rows:
+        abort(404)
+    artist = rows[0].Artist
+    shows = [row for row in rows if row.start_time is not None]
+    upcoming_shows = [show for show in shows if show.upcoming]
+    past_shows = [show for show in reversed(shows) if not show.upcoming]
+
+    # Prepare the data object
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": [{
+            "venue_id": show.venue_id,
+            "venue_name": show.name,
+            "venue_image_link": show.image_link,
+            "start_time": show.start_time
+        } for show in past_shows],
+        "upcoming_shows": [{
+            "venue_id": show.venue_id,
+            "venue_name": show.name,
+            "venue_image_link": show.image_link,
+            "start_time": show.start_time
+        } for show in upcoming_shows],
+        "past_shows_count": len(past_shows),
+        # The query only returns the listed upcoming shows
+        "upcoming_shows_count": upcoming_shows[0].shows_count if upcoming_shows else 0,
+    }
+    next_show_time = upcoming_shows[0].start_time if upcoming_shows else None
+    return data, next_show_time
+
+
+def shows_query():
+    '''Query of the shows with their venue and artist names.'''
+    return db.session.query(
+        Shows.id,
+        Shows.venue_id,
+        Venue.name.label('venue_name'),
+        Shows.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link,
+        Shows.start_time,
+        Shows.duration
+    ).join(Shows, Shows.venue_id == Venue.id
+           ).join(Artist, Shows.artist_id == Artist.id)
+
+
+def upcoming_shows_query():
+    '''Query of the upcoming shows with their venue and artist names.'''
+    return shows_query().filter(Shows.start_time > datetime.now())
+
+
+def show_listing(shows):
+    '''Turn rows of shows_query into the /shows data objects.'''
+    return ({
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.image_link,
+        "start_time": show.start_time,
+        "duration": show.duration
+    } for show in shows)
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{name} must be a date as YYYY-MM-DD')
+
+
+def _id_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    if not (value.isascii() and value.isdigit()) or int(value) > INT4_MAX:
+        raise ValueError(f'{name} must be an id')
+    return int(value)
+
+
+def calendar_window():
+    '''Read the calendar window from ?from= and ?to= (dates, both
+    included), ?venue= and ?artist=.
+
+    Returns None when neither date is given. A missing end is the other
+    one a month apart. Raises ValueError on invalid arguments.
+    '''
+    first, last = _date_arg('from'), _date_arg('to')
+    if first is None and last is None:
+        return None
+    month = timedelta(days=30)
+    try:
+        first = first or last - month
+        last = last or first + month
+        # The shows of the window are read up to the day after it
+        last + timedelta(days=1)
+    except OverflowError:
+        raise ValueError(f'The calendar must lie between {date.min} and {date.max}')
+    if last < first:
+        raise ValueError('to must not be before from')
+    if (last - first).days >= current_app.config['CALENDAR_MAX_DAYS']:
+        raise ValueError('The calendar spans at most {} days'.format(
+            current_app.config['CALENDAR_MAX_DAYS']))
+    return {
+        "from": first,
+        "to": last,
+        "venue": _id_arg('venue'),
+        "artist": _id_arg('artist'),
+    }
+
+
+def _in_window(query, window):
+    # A range on start_time, served by its btree index (or the venue /
+    # artist ones when filtered), whatever the age of the window
+    start = datetime.combine(window["from"], datetime.min.time())
+    end = datetime.combine(window["to"], datetime.min.time()) + timedelta(days=1)
+    query = query.filter(Shows.start_time >= start, Shows.start_time < end)
+    if window["venue"] is not None:
+        query = query.filter(Shows.venue_id == window["venue"])
+    if window["artist"] is not None:
+        query = query.filter(Shows.artist_id == window["artist"])
+    return query
+
+
+def calendar_day_counts_query(window):
+    '''Query of (date, number of shows) for the days of the window.'''
+    day = db.cast(Shows.start_time, db.Date).label('day')
+    return _in_window(db.session.query(day, func.count()), window
+                      ).group_by(day)
+
+
+def calendar_shows_query(window):
+    '''Query of the first CALENDAR_MAX_SHOWS shows of the window.'''
+    return _in_window(shows_query(), window).order_by(
+        Shows.start_time, Shows.id).limit(current_app.config['CALENDAR_MAX_SHOWS'])
+
+
+def show_calendar(window, day_counts, shows):
+    '''Group the shows of the window by day, every day included.
+
+    Each day has the number of its shows and the ones listed, which are
+    fewer when the window holds more than CALENDAR_MAX_SHOWS.
+    '''
+    counts = dict(day_counts)
+    listed = {day: list(day_shows) for day, day_shows in groupby(
+        show_listing(shows), key=lambda show: show["start_time"].date())}
+    days = []
+    day = window["from"]
+    while day <= window["to"]:
+        days.append({"date": day, "count": counts.get(day, 0),
+                     "shows": listed.get(day, [])})
+        day += timedelta(days=1)
+    return days
+
+
+def calendar_links(window):
+    '''URLs of the windows of the same length before and after, None
+    past the first or last supported date.'''
+    length = window["to"] - window["from"] + timedelta(days=1)
+    args = request.args.to_dict(flat=False)
+
+    def link(offset):
+        try:
+            first = window["from"] + offset
+            last = first + length - timedelta(days=1)
+        except OverflowError:
+            return None
+        return url_for(request.endpoint, **dict(args, **{
+            "from": first.isoformat(), "to": last.isoformat()}))
+    return {"previous": link(-length), "next": link(length)}
@@ -0,0 +1,102 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import re
+import sys
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import app
+
+#----------------------------------------------------------------------------#
+# N+1 and redundant query detection (development).
+#----------------------------------------------------------------------------#
+
+# Literals and bound parameters, replaced by ? to get the statement shape
+LITERALS = re.compile(r"%\(\w+\)s|%s|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Lists of placeholders, e.g. the IN (...) and VALUES (...), (...) lists
+PLACEHOLDER_LISTS = re.compile(r'\(\?(?:\s*,\s*\?)*\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))*')
+WHITESPACE = re.compile(r'\s+')
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(PROJECT_DIR, 'app.py')
+
+
+def normalize(statement):
+    '''Reduce a statement to its shape, without any literal value.'''
+    shape = LITERALS.sub('?', statement)
+    shape = PLACEHOLDER_LISTS.sub('(?)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def caller_location():
+    '''Return "file:line in function" of the code running a query.
+
+    That is the innermost frame of app.py, else of any other module of
+    the project (e.g. a CLI command), ignoring this one.
+    '''
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename == APP_FILE:
+            fallback = frame
+            break
+        if fallback is None and filename.startswith(PROJECT_DIR) and \
+                filename != __file__ and 'site-packages' not in filename:
+            fallback = frame
+        frame = frame.f_back
+    if fallback is None:
+        return 'unknown location'
+    return '{}:{} in {}'.format(os.path.relpath(fallback.f_code.co_filename, PROJECT_DIR),
+                                fallback.f_lineno, fallback.f_code.co_name)
+
+
+def _enabled():
+    return has_request_context() and 'query_shapes' in g
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    if not _enabled():
+        return
+    shape = normalize(statement)
+    entry = g.query_shapes.get(shape)
+    if entry is None:
+        g.query_shapes[shape] = entry = [0, set()]
+    entry[0] += 1
+    entry[1].add(caller_location())
+    g.query_count += 1
+
+
+def _start_query_check():
+    g.query_shapes = {}
+    g.query_count = 0
+
+
+def _report_queries(error=None):
+    if 'query_shapes' not in g:
+        return
+    shapes, count = g.pop('query_shapes'), g.pop('query_count')
+    endpoint = request.endpoint or 'unmatched'
+    for shape, (runs, locations) in shapes.items():
+        if runs >= app.config['QUERY_REPEAT_THRESHOLD']:
+            app.logger.warning(
+                'Possible N+1 in %s %s: the same query ran %d times from %s: %s',
+                request.method, endpoint, runs, ', '.join(sorted(locations)),
+                shape[:300])
+    budget = app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_BUDGET'])
+    if count > budget:
+        worst = sorted(shapes.items(), key=lambda item: -item[1][0])[:3]
+        app.logger.warning(
+            'Query budget exceeded in %s %s: %d queries for a budget of %d. '
+            'Most run: %s', request.method, endpoint, count, budget,
+            '; '.join(f'{runs} x {shape[:120]} ({", ".join(sorted(locations))})'
+                      for shape, (runs, locations) in worst))
+
+
+if app.config['QUERY_CHECK']:
+    app.before_request(_start_query_check)
+    app.teardown_request(_report_queries)
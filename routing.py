@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import random
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from pool import TimedQueuePool
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+# Requests that never write, so their queries may run on a replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Set on a client after it wrote, so it reads its own changes
+PRIMARY_COOKIE = 'read_primary'
+
+
+def replica_reads(view):
+    '''Let a view that only reads use a replica whatever its method
+    (e.g. the search forms, which are POSTed).'''
+    view.replica_reads = True
+    return view
+
+
+def reads_replica():
+    '''Whether the queries of the current request run on a replica.
+
+    A replica may lag behind the commit that just invalidated a cache,
+    so what it returns must not be cached.
+    '''
+    return has_request_context() and g.get('db_bind') is not None
+
+
+class RoutingSession(SignallingSession):
+    '''Session running the queries of a read request on its replica.
+
+    Flushes always go to the primary, so a read request that writes
+    by mistake fails there loudly instead of on a read only replica.
+    '''
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = g.get('db_bind') if has_request_context() else None
+        if bind is not None and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=bind)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''SQLAlchemy routing read requests to SQLALCHEMY_REPLICA_URIS.
+
+    Each replica becomes a "replica_<n>" bind. A read request picks one
+    of them at random; writes, CLI commands and the requests of a
+    client during REPLICA_STICKY_TIMEOUT seconds after it wrote use the
+    primary. With no replica configured everything uses the primary.
+    '''
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # Measure checkout waits for /stats/db
+        if sa_url.drivername.startswith('postgresql'):
+            options.setdefault('poolclass', TimedQueuePool)
+        return super().apply_driver_hacks(app, sa_url, options)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('REPLICA_STICKY_TIMEOUT', 5)
+        replicas = {f'replica_{number}': uri for number, uri
+                    in enumerate(app.config['SQLALCHEMY_REPLICA_URIS'])}
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        app.config['SQLALCHEMY_BINDS'] = dict(binds, **replicas)
+        super().init_app(app)
+
+        @app.before_request
+        def route_to_replica():
+            view = app.view_functions.get(request.endpoint)
+            reads = request.method in READ_METHODS or \
+                getattr(view, 'replica_reads', False)
+            if replicas and reads and not request.cookies.get(PRIMARY_COOKIE):
+                g.db_bind = random.choice(list(replicas))
+            else:
+                g.db_bind = None
+
+        @app.after_request
+        def stick_to_primary(response):
+            view = app.view_functions.get(request.endpoint)
+            if replicas and request.method not in READ_METHODS and \
+                    not getattr(view, 'replica_reads', False):
+                response.set_cookie(PRIMARY_COOKIE, '1', httponly=True,
+                                    max_age=app.config['REPLICA_STICKY_TIMEOUT'])
+            return response
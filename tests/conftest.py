@@ -0,0 +1,73 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import app as flask_app, db, Venue, Artist  # noqa: E402
+
+#----------------------------------------------------------------------------#
+# Test configuration.
+#
+# The tests marked as needing the database run against
+# FYYUR_TEST_DATABASE_URI, a PostgreSQL database migrated with
+# `flask db upgrade`; they are skipped when it is not set. Each of them
+# starts by emptying the venues, artists and shows, so never point it
+# at a database holding real data.
+#----------------------------------------------------------------------------#
+
+TEST_DATABASE_URI = os.environ.get('FYYUR_TEST_DATABASE_URI')
+if TEST_DATABASE_URI:
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URI
+    flask_app.config['SQLALCHEMY_ASYNC_DATABASE_URI'] = TEST_DATABASE_URI.replace(
+        'postgresql://', 'postgresql+asyncpg://', 1)
+flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, QUERY_CHECK=False)
+
+import app  # noqa: E402,F401 registers the routes
+
+
+@pytest.fixture
+def database():
+    if not TEST_DATABASE_URI:
+        pytest.skip('FYYUR_TEST_DATABASE_URI is not set')
+    with flask_app.app_context():
+        db.session.execute('TRUNCATE shows, "Venue", "Artist" RESTART IDENTITY CASCADE')
+        db.session.commit()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(database):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def make_venue(database):
+    def make_venue(**fields):
+        venue = Venue(**dict({
+            'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'phone': '123-123-1234',
+            'genres': ['Jazz'],
+        }, **fields))
+        db.session.add(venue)
+        db.session.commit()
+        return venue.id
+    return make_venue
+
+
+@pytest.fixture
+def make_artist(database):
+    def make_artist(**fields):
+        artist = Artist(**dict({
+            'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '326-123-5000', 'genres': ['Rock n Roll'],
+        }, **fields))
+        db.session.add(artist)
+        db.session.commit()
+        return artist.id
+    return make_artist
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db, Shows
+
+
+@pytest.fixture
+def show(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    start_time = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id, start_time=start_time))
+    db.session.commit()
+    return venue_id, artist_id, start_time
+
+
+def test_listing_fields(show, client):
+    venue_id, _, start_time = show
+    response = client.get('/api/v1/venues?fields=name,num_upcoming_shows')
+    assert response.get_json() == {
+        'data': [{'name': 'The Musical Hop', 'num_upcoming_shows': 1}],
+        'next_cursor': None, 'prev_cursor': None,
+    }
+    data = client.get('/api/v1/shows?fields=venue_name,start_time').get_json()['data']
+    assert data == [{'venue_name': 'The Musical Hop', 'start_time': start_time.isoformat()}]
+
+
+def test_detail_fields(show, client):
+    venue_id, artist_id, start_time = show
+    assert client.get(f'/api/v1/venues/{venue_id}?fields=city').get_json() == \
+        {'city': 'San Francisco'}
+    data = client.get(f'/api/v1/artists/{artist_id}?fields=name,upcoming_shows_count,'
+                      'next_show_time').get_json()
+    assert data == {'name': 'Guns N Petals', 'upcoming_shows_count': 1,
+                    'next_show_time': start_time.isoformat()}
+
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/venues?fields=name,password',
+    '/api/v1/shows?fields=,',
+    '/api/v1/artists/1?fields=past_shows,nope',
+])
+def test_unknown_fields(database, client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown field requested'}
+
+
+def test_not_found(database, client):
+    assert client.get('/api/v1/venues/1?fields=name').status_code == 404
+    assert client.get('/api/v1/venues/1').get_json() == {'error': 'Not found'}
+
+
+def test_json_fallback_matches_orjson(show, client, monkeypatch):
+    venue_id, _, _ = show
+    url = f'/api/v1/venues/{venue_id}'
+    body = client.get(url).get_data()
+    monkeypatch.setattr('api.orjson', None)
+    assert client.get(url).get_data() == body
@@ -0,0 +1,98 @@
+import asyncio
+from models import app, db, Shows
+from app import search_cache, fragment_cache
+from cache import FileSystemBackend
+import asgi
+import metrics
+
+
+def get(path, query_string=b'', method='GET', body=b''):
+    '''Serve one request with the ASGI application.'''
+    scope = {'type': 'http', 'method': method, 'path': path, 'http_version': '1.1',
+             'query_string': query_string, 'headers': [
+                 (b'content-type', b'application/x-www-form-urlencoded'),
+                 (b'content-length', str(len(body)).encode())]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        messages.append(message)
+
+    async def serve():
+        try:
+            await asgi.application(scope, receive, send)
+        finally:
+            # Each test runs its own event loop
+            for engine in asgi.sessions:
+                await engine.dispose()
+    asyncio.run(serve())
+    return messages[0]['status'], messages[1]['body']
+
+
+def clear_caches():
+    search_cache.clear()
+    fragment_cache.invalidate('Venue', 0)
+
+
+def test_pages_match_the_flask_views(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id))
+    db.session.commit()
+    client = app.test_client()
+    for path in ('/venues', '/artists', '/shows', f'/venues/{venue_id}',
+                 f'/artists/{artist_id}'):
+        clear_caches()
+        status, body = get(path)
+        assert status == 200
+        assert body == client.get(path).data
+
+
+def test_requests_are_measured(make_venue):
+    venue_id = make_venue()
+    labels = ('show_venue', 'GET')
+    before = metrics.sql_statements_total._series[labels]
+    fragment_cache.invalidate('Venue', venue_id)
+    assert get(f'/venues/{venue_id}')[0] == 200
+    assert metrics.sql_statements_total._series[labels] > before
+    assert get(f'/venues/{venue_id + 1}')[0] == 404
+    assert metrics.requests_total._series[labels + (404,)] >= 1
+
+
+def test_errors_use_the_error_handlers(database, monkeypatch):
+    def fail(rows):
+        raise RuntimeError('boom')
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+    monkeypatch.setattr(asgi, 'venue_areas', fail)
+    status, body = get('/venues')
+    assert status == 500
+    # Rendered by the app's 500 handler
+    assert b'Something went wrong.' in body
+    assert get('/venues', b'after=abc')[0] == 400
+
+
+def test_search(make_artist):
+    make_artist()
+    make_artist(name='The Wild Sax Band')
+    search_cache.clear()
+    status, body = get('/artists/search', method='POST', body=b'search_term=petals')
+    assert status == 200
+    assert b'Guns N Petals' in body
+    assert b'The Wild Sax Band' not in body
+    assert search_cache.get(('Artist', 'petals')) is not None
+
+
+def test_filesystem_fragments_in_a_thread(make_venue, tmp_path, monkeypatch):
+    venue_id = make_venue()
+    monkeypatch.setattr(fragment_cache, 'backend', FileSystemBackend(str(tmp_path)))
+    threads = []
+    to_thread = asyncio.to_thread
+
+    async def record(function, *args):
+        threads.append(function.__name__)
+        return await to_thread(function, *args)
+    monkeypatch.setattr(asyncio, 'to_thread', record)
+    assert get(f'/venues/{venue_id}')[0] == 200
+    assert threads == ['key', 'get', 'set']
+    assert fragment_cache.get(fragment_cache.key('Venue', venue_id, False)) is not None
@@ -0,0 +1,38 @@
+import random
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Shows
+from forms import DEFAULT_SHOW_DURATION
+from benchmark import (dataset_size, generate_shows, seed_dataset, run_benchmark,
+                       compare_runs)
+
+NOW = datetime(2026, 10, 18)
+
+
+def test_generated_shows_never_double_book_a_venue():
+    shows = [show for _, show in generate_shows(random.Random(0), 2000, [1, 2, 3],
+                                                 list(range(1, 21)), NOW)]
+    slots = {(show['venue_id'], show['start_time']) for show in shows}
+    assert len(slots) == 2000
+    # DEFAULT_SHOW_DURATION apart, so no two shows of a venue overlap
+    assert all((show['start_time'] - NOW) % timedelta(minutes=DEFAULT_SHOW_DURATION)
+               == timedelta(0) for show in shows)
+    # The same seed gives the same dataset
+    assert shows == [show for _, show in generate_shows(
+        random.Random(0), 2000, [1, 2, 3], list(range(1, 21)), NOW)]
+
+
+def test_seed_and_benchmark(database):
+    assert seed_dataset(300) == dataset_size(300) == (10, 20)
+    assert (Venue.query.count(), Artist.query.count(), Shows.query.count()) == (10, 20, 300)
+    # The counters are refreshed after COPY
+    upcoming = Shows.query.filter(Shows.start_time > datetime.now()).count()
+    assert db.session.query(db.func.sum(Venue.upcoming_shows_count)).scalar() == upcoming
+    db.session.remove()
+
+    results = run_benchmark(repeat=2, warmup=0, routes=['venues', 'search_venues'])
+    assert sorted(results) == ['search_venues', 'venues']
+    assert results['venues']['queries'] >= 1
+    assert results['venues']['time']['min'] <= results['venues']['time']['median']
+    ratios = {name: ratio for name, _, _, ratio in compare_runs(
+        {'routes': results}, {'routes': results})}
+    assert ratios == {'search_venues': 1.0, 'venues': 1.0}
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+import pytest
+from models import (db, Venue, Artist, Shows, venue_conflicts, lineup_conflicts,
+                    lock_venue_bookings, BOOKING_LOCK, BOOKING_LOCK_SLOTS)
+from partitions import month_start, next_month
+
+# Around the end of a month, so the shows fall in two partitions
+EVENING = datetime(2026, 10, 31, 22, 0)
+MIDNIGHT = datetime(2026, 11, 1, 0, 0)
+
+
+@pytest.fixture
+def booked(make_venue, make_artist):
+    '''A venue booked from 22:00 to midnight and an artist.'''
+    venue_id, artist_id = make_venue(), make_artist()
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id,
+                         start_time=EVENING, duration=120))
+    db.session.commit()
+    return venue_id, artist_id
+
+
+def test_venue_conflicts(booked):
+    venue_id, _ = booked
+    assert venue_conflicts(venue_id, datetime(2026, 10, 31, 23, 0), 60).count() == 1
+    # Across the month boundary, from the other partition
+    assert venue_conflicts(venue_id, datetime(2026, 10, 31, 21, 0), 300).count() == 1
+    # Periods are half open: a show may start when the previous one ends
+    assert venue_conflicts(venue_id, MIDNIGHT, 60).count() == 0
+    assert venue_conflicts(venue_id, datetime(2026, 10, 31, 20, 0), 120).count() == 0
+    assert venue_conflicts(venue_id + 1, EVENING, 60).count() == 0
+
+
+def test_a_long_show_conflicts_with_the_next_month(booked, make_artist):
+    venue_id, artist_id = booked
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id,
+                         start_time=datetime(2026, 11, 1, 1, 0), duration=60))
+    db.session.commit()
+    conflicts = venue_conflicts(venue_id, datetime(2026, 10, 31, 23, 30), 180)
+    assert sorted(show.start_time for show in conflicts) == \
+        [EVENING, datetime(2026, 11, 1, 1, 0)]
+
+
+def test_lineup_conflicts(booked):
+    venue_id, artist_id = booked
+    lineup = [
+        {'venue_id': venue_id, 'start_time': MIDNIGHT, 'duration': 60},
+        {'venue_id': venue_id + 1, 'start_time': EVENING, 'duration': 60},
+    ]
+    assert lineup_conflicts(lineup).count() == 0
+    lineup.append({'venue_id': venue_id, 'start_time': datetime(2026, 10, 31, 23, 59),
+                   'duration': 1})
+    assert [show.venue_id for show in lineup_conflicts(lineup)] == [venue_id]
+
+
+def test_lock_venue_bookings(database):
+    lock_venue_bookings(['7', 7 + BOOKING_LOCK_SLOTS])
+    with db.engine.connect() as other:
+        def try_lock(venue_id):
+            return other.execute(db.select([db.func.pg_try_advisory_xact_lock(
+                BOOKING_LOCK, venue_id % BOOKING_LOCK_SLOTS)])).scalar()
+        assert not try_lock(7)
+        assert try_lock(8)
+    db.session.rollback()
+
+
+def post_show(client, **fields):
+    return client.post('/shows/create', data=fields).get_data(as_text=True)
+
+
+def test_create_show(booked, client):
+    venue_id, artist_id = booked
+    page = post_show(client, artist_id=artist_id, venue_id=venue_id,
+                     start_time='2026-11-01 00:00:00', duration=60)
+    assert 'Show was successfully listed!' in page
+    page = post_show(client, artist_id=artist_id, venue_id=venue_id,
+                     start_time='2026-10-31 23:00:00', duration=30)
+    assert f'Venue {venue_id} is already booked from 2026-10-31 22:00' in page
+    assert Shows.query.count() == 2
+
+
+@pytest.mark.parametrize('fields, error', [
+    ({'start_time': ''}, 'start time must be in format'),
+    ({'start_time': 'tomorrow'}, 'start time must be in format'),
+    ({'venue_id': ''}, 'venue_id must be a positive number'),
+    ({'venue_id': str(2 ** 31)}, 'venue_id must be a positive number'),
+    ({'artist_id': 'one'}, 'artist_id must be a positive number'),
+    ({'duration': '0'}, 'a show lasts at least a minute'),
+])
+def test_invalid_show_is_not_checked_for_conflicts(booked, client, fields, error):
+    venue_id, artist_id = booked
+    page = post_show(client, **dict({
+        'artist_id': artist_id, 'venue_id': venue_id,
+        'start_time': '2026-11-02 20:00:00', 'duration': 60}, **fields))
+    assert error in page
+    assert 'already booked' not in page
+    assert Shows.query.count() == 1
+
+
+def post_lineup(client, *lines):
+    return client.post('/shows/create/batch',
+                       data={'lineup': '\n'.join(lines)}).get_data(as_text=True)
+
+
+def test_create_show_batch(make_venue, make_artist, client):
+    venue_id, artist_id, other_artist_id = make_venue(), make_artist(), make_artist()
+    # Around the end of next month, so every show stays upcoming and they
+    # fall in two partitions
+    midnight = next_month(next_month(month_start(datetime.now())))
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id,
+                         start_time=midnight - timedelta(hours=2), duration=120))
+    db.session.commit()
+    page = post_lineup(client, f'{artist_id}, {venue_id}, {midnight:%Y-%m-%d %H:%M}, 60',
+                       '', f'{other_artist_id}, {venue_id}, '
+                       f'{midnight + timedelta(hours=1):%Y-%m-%d %H:%M}')
+    assert '2 shows were successfully listed!' in page
+    assert Shows.query.count() == 3
+    # Inserted without the mapper events, counted all the same
+    assert Venue.query.get(venue_id).upcoming_shows_count == 3
+    assert Artist.query.get(other_artist_id).upcoming_shows_count == 1
+
+
+@pytest.mark.parametrize('lines, error', [
+    (['{artist_id}, {venue_id}, 2026-11-02 20:00',
+      '{artist_id}, {venue_id}, 2026-11-02 21:00'],
+     'lines 1 and 2 book venue {venue_id} at the same time'),
+    (['{artist_id}, {venue_id}, 2026-11-02 20:00, 0'], 'duration on line 1'),
+    (['{artist_id}, {venue_id}'], 'line 1 must be in format'),
+    (['{artist_id}, {venue_id}, 2026-11-02 20:00', '{artist_id}, 99, 2026-11-02 20:00'],
+     'Unknown venue 99. No show was listed.'),
+    (['{artist_id}, {venue_id}, 2026-11-02 20:00', '{artist_id}, {venue_id}, 2026-10-31 23:30'],
+     'Venue {venue_id} is already booked from 2026-10-31 22:00'),
+])
+def test_invalid_show_batch(booked, client, lines, error):
+    venue_id, artist_id = booked
+    page = post_lineup(client, *[line.format(artist_id=artist_id, venue_id=venue_id)
+                                 for line in lines])
+    assert error.format(venue_id=venue_id) in page
+    assert Shows.query.count() == 1
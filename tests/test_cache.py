@@ -0,0 +1,95 @@
+import os
+import time
+from models import db, Venue, Artist, Shows
+from cache import LRUCache, FileSystemBackend, FragmentCache
+from app import fragment_cache
+
+
+def test_lru_cache_evicts_and_expires():
+    cache = LRUCache(maxsize=2, timeout=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    cache.set('d', 4, timeout=-1)
+    assert cache.get('d') is None
+
+
+def test_filesystem_backend(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), timeout=60)
+    backend.set(('fragment', 'Venue', 1), {'name': 'The Musical Hop'})
+    backend.set(('version', 'Venue', 1), 42, float('inf'))
+    assert backend.get(('fragment', 'Venue', 1)) == {'name': 'The Musical Hop'}
+    assert backend.get(('version', 'Venue', 1)) == 42
+    backend.set(('fragment', 'Venue', 2), 'expired', -1)
+    assert backend.get(('fragment', 'Venue', 2)) is None
+    # Read expired entries are removed right away
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_sweep_removes_expired_and_oldest_entries(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), timeout=60, maxsize=3,
+                                sweep_interval=3600)
+    # Sweep now, so that the writes below do not
+    assert backend.sweep() == 0
+    for number in range(4):
+        backend.set(('expired', number), number, -1)
+    for number in range(5):
+        backend.set(('kept', number), number)
+        # Distinct write times, oldest first
+        past = time.time() - 100 + number
+        os.utime(backend._path(('kept', number)), (past, past))
+    assert len(os.listdir(tmp_path)) == 9
+    assert backend.sweep() == 6
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(backend._path(('kept', number))) for number in (2, 3, 4))
+
+
+def test_sweep_runs_on_set(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), timeout=60, sweep_interval=3600)
+    backend.set('old', 1, -1)
+    backend._next_sweep = 0
+    backend.set('new', 2)
+    assert backend.get('new') == 2
+    assert os.listdir(tmp_path) == [os.path.basename(backend._path('new'))]
+
+
+def test_invalidate_changes_the_fragment_key():
+    cache = FragmentCache(LRUCache())
+    key = cache.key('Venue', 1)
+    cache.set(key, 'fragment')
+    assert cache.get(cache.key('Venue', 1)) == 'fragment'
+    cache.invalidate('Venue', 1)
+    assert cache.key('Venue', 1) != key
+    assert cache.get(cache.key('Venue', 1)) is None
+
+
+def test_renaming_a_venue_invalidates_its_artists(make_venue, make_artist):
+    venue_id, artist_id, other_artist_id = make_venue(), make_artist(), make_artist()
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id))
+    db.session.commit()
+    artist_key = fragment_cache.key('Artist', artist_id)
+    other_key = fragment_cache.key('Artist', other_artist_id)
+
+    Venue.query.get(venue_id).name = 'The Dueling Pianos Bar'
+    db.session.commit()
+    assert fragment_cache.key('Artist', artist_id) != artist_key
+    assert fragment_cache.key('Artist', other_artist_id) == other_key
+
+    # Changes the pages do not show leave them alone
+    artist_key = fragment_cache.key('Artist', artist_id)
+    Venue.query.get(venue_id).phone = '914-003-1132'
+    db.session.commit()
+    assert fragment_cache.key('Artist', artist_id) == artist_key
+
+
+def test_renaming_an_artist_invalidates_its_venues(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id))
+    db.session.commit()
+    venue_key = fragment_cache.key('Venue', venue_id)
+    Artist.query.get(artist_id).image_link = 'https://example.com/petals.jpg'
+    db.session.commit()
+    assert fragment_cache.key('Venue', venue_id) != venue_key
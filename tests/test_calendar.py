@@ -0,0 +1,89 @@
+from datetime import date, datetime
+import pytest
+from models import app, db, Shows
+from queries import (calendar_window, calendar_links, show_calendar,
+                     calendar_day_counts_query, calendar_shows_query)
+
+
+def window(query_string):
+    with app.test_request_context('/shows?' + query_string):
+        return calendar_window()
+
+
+def test_calendar_window():
+    assert window('') is None
+    assert window('from=2021-06-01&to=2021-06-03&venue=4') == {
+        "from": date(2021, 6, 1), "to": date(2021, 6, 3), "venue": 4, "artist": None}
+    # A missing end is a month away from the other one
+    assert window('from=2021-06-01')["to"] == date(2021, 7, 1)
+    assert window('to=2021-07-01')["from"] == date(2021, 6, 1)
+    assert window('from=0001-01-01&to=0001-01-02')["from"] == date(1, 1, 1)
+
+
+@pytest.mark.parametrize('query_string', [
+    'from=June',
+    'from=2021-06-03&to=2021-06-01',
+    'from=2021-01-01&to=2022-01-01',
+    'from=2021-06-01&venue=-1',
+    'from=2021-06-01&venue=' + str(2 ** 31),
+    'from=2021-06-01&artist=²',
+    'to=0001-01-10',
+    'from=9999-12-25',
+    'from=9999-12-30&to=9999-12-31',
+])
+def test_invalid_calendar_window(query_string):
+    with pytest.raises(ValueError):
+        window(query_string)
+
+
+def test_calendar_links():
+    with app.test_request_context('/shows?from=2021-06-01&to=2021-06-07&venue=4'):
+        links = calendar_links(calendar_window())
+    assert links["previous"] == '/shows?from=2021-05-25&to=2021-05-31&venue=4'
+    assert links["next"] == '/shows?from=2021-06-08&to=2021-06-14&venue=4'
+    with app.test_request_context('/shows?from=0001-01-01&to=0001-01-07'):
+        links = calendar_links(calendar_window())
+    assert links["previous"] is None and links["next"] is not None
+    with app.test_request_context('/shows?from=9999-12-24&to=9999-12-30'):
+        assert calendar_links(calendar_window())["next"] is None
+
+
+@pytest.mark.parametrize('url', [
+    '/shows?to=0001-01-10', '/shows?from=9999-12-25', '/shows?from=2021-06-01&venue=99999999999',
+    '/api/v1/shows/calendar?to=0001-01-10', '/api/v1/shows/calendar?from=9999-12-25',
+])
+def test_out_of_range_calendar_is_a_bad_request(url):
+    assert app.test_client().get(url).status_code == 400
+
+
+def test_show_calendar(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    other_venue_id = make_venue()
+    db.session.add_all([
+        Shows(venue_id=venue_id, artist_id=artist_id, start_time=datetime(2026, 10, 30, 20)),
+        Shows(venue_id=venue_id, artist_id=artist_id, start_time=datetime(2026, 11, 1, 20)),
+        Shows(venue_id=venue_id, artist_id=artist_id, start_time=datetime(2026, 11, 1, 23)),
+        Shows(venue_id=other_venue_id, artist_id=artist_id, start_time=datetime(2026, 11, 1, 12)),
+        Shows(venue_id=venue_id, artist_id=artist_id, start_time=datetime(2026, 11, 3, 0)),
+    ])
+    db.session.commit()
+    with app.test_request_context(f'/shows?from=2026-10-31&to=2026-11-02&venue={venue_id}'):
+        calendar = calendar_window()
+        days = show_calendar(calendar, calendar_day_counts_query(calendar),
+                             calendar_shows_query(calendar))
+    assert [(day["date"], day["count"], len(day["shows"])) for day in days] == [
+        (date(2026, 10, 31), 0, 0), (date(2026, 11, 1), 2, 2), (date(2026, 11, 2), 0, 0)]
+    assert [show["start_time"] for show in days[1]["shows"]] == \
+        [datetime(2026, 11, 1, 20), datetime(2026, 11, 1, 23)]
+
+
+def test_calendar_lists_at_most_calendar_max_shows(make_venue, make_artist, monkeypatch):
+    monkeypatch.setitem(app.config, 'CALENDAR_MAX_SHOWS', 1)
+    venue_id, artist_id = make_venue(), make_artist()
+    db.session.add_all(Shows(venue_id=venue_id, artist_id=artist_id,
+                             start_time=datetime(2026, 11, 1, hour)) for hour in (12, 18))
+    db.session.commit()
+    response = app.test_client().get('/api/v1/shows/calendar?from=2026-11-01&to=2026-11-01')
+    day, = response.get_json()["days"]
+    assert day["count"] == 2
+    assert len(day["shows"]) == 1
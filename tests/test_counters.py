@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Shows, refresh_show_counters, sweep_show_counters
+
+
+def counters(model, id):
+    row = db.session.query(model.upcoming_shows_count, model.next_show_time).filter(
+        model.id == id).one()
+    return tuple(row)
+
+
+def add_show(venue_id, artist_id, start_time):
+    show = Shows(venue_id=venue_id, artist_id=artist_id, start_time=start_time,
+                 duration=60)
+    db.session.add(show)
+    db.session.commit()
+    return show
+
+
+def test_inserted_shows_are_counted(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    now = datetime.now().replace(microsecond=0)
+    add_show(venue_id, artist_id, now + timedelta(days=2))
+    add_show(venue_id, artist_id, now + timedelta(days=1))
+    # Past shows are not upcoming
+    add_show(venue_id, artist_id, now - timedelta(days=1))
+    assert counters(Venue, venue_id) == (2, now + timedelta(days=1))
+    assert counters(Artist, artist_id) == (2, now + timedelta(days=1))
+
+
+def test_deleted_and_moved_shows_are_recounted(make_venue, make_artist):
+    venue_id, other_venue_id, artist_id = make_venue(), make_venue(), make_artist()
+    now = datetime.now().replace(microsecond=0)
+    first = add_show(venue_id, artist_id, now + timedelta(days=1))
+    second = add_show(venue_id, artist_id, now + timedelta(days=2))
+
+    second.venue_id = other_venue_id
+    db.session.commit()
+    assert counters(Venue, venue_id) == (1, now + timedelta(days=1))
+    assert counters(Venue, other_venue_id) == (1, now + timedelta(days=2))
+    assert counters(Artist, artist_id) == (2, now + timedelta(days=1))
+
+    db.session.delete(first)
+    db.session.commit()
+    assert counters(Venue, venue_id) == (0, None)
+    assert counters(Artist, artist_id) == (1, now + timedelta(days=2))
+
+
+def test_refresh_show_counters(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    now = datetime.now().replace(microsecond=0)
+    # Inserted without the mapper events, as COPY does
+    db.session.execute(Shows.__table__.insert().values(
+        venue_id=venue_id, artist_id=artist_id, start_time=now + timedelta(days=1)))
+    db.session.commit()
+    assert counters(Venue, venue_id) == (0, None)
+    assert refresh_show_counters(db.session, Venue, {venue_id}) == 1
+    db.session.commit()
+    assert counters(Venue, venue_id) == (1, now + timedelta(days=1))
+    assert counters(Artist, artist_id) == (0, None)
+
+
+def test_sweep_show_counters(make_venue, make_artist):
+    venue_id, artist_id, other_artist_id = make_venue(), make_artist(), make_artist()
+    now = datetime.now().replace(microsecond=0)
+    add_show(venue_id, artist_id, now + timedelta(hours=1))
+    add_show(venue_id, artist_id, now + timedelta(days=1))
+    add_show(venue_id, other_artist_id, now + timedelta(days=2))
+    # Nothing has started yet
+    assert sweep_show_counters(db.session, now=now) == 0
+    # An hour and a half later, the first show has started: only the
+    # venue and artist it was the next show of are refreshed
+    assert sweep_show_counters(db.session, now=now + timedelta(minutes=90)) == 2
+    db.session.commit()
+    assert counters(Venue, venue_id) == (2, now + timedelta(days=1))
+    assert counters(Artist, artist_id) == (1, now + timedelta(days=1))
+    assert counters(Artist, other_artist_id) == (1, now + timedelta(days=2))
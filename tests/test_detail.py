@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from models import app, db, Shows
+from queries import venue_detail, artist_detail
+
+
+def add_shows(artist_id, venue_id, *start_times):
+    db.session.add_all(Shows(artist_id=artist_id, venue_id=venue_id,
+                             start_time=start_time, duration=60)
+                       for start_time in start_times)
+    db.session.commit()
+
+
+def test_alike_shows_are_all_counted(make_venue, make_artist):
+    # An artist booked at the same time in two venues of the same name:
+    # only the venue and show ids tell the rows apart
+    venue_ids = [make_venue(), make_venue()]
+    artist_id = make_artist()
+    past = datetime.now().replace(microsecond=0) - timedelta(days=3)
+    upcoming = past + timedelta(days=10)
+    for venue_id in venue_ids:
+        add_shows(artist_id, venue_id, past, upcoming)
+    with app.test_request_context():
+        data, _ = artist_detail(artist_id)
+    assert data['past_shows_count'] == data['upcoming_shows_count'] == 2
+    assert len(data['past_shows']) == len(data['upcoming_shows']) == 2
+
+
+def test_upcoming_shows_are_limited(make_venue, make_artist, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPCOMING_SHOWS_LIMIT', 2)
+    venue_id, artist_id = make_venue(), make_artist()
+    now = datetime.now().replace(microsecond=0)
+    add_shows(artist_id, venue_id, now - timedelta(days=2), now - timedelta(days=1),
+              *[now + timedelta(days=day) for day in (3, 1, 2)])
+    with app.test_request_context():
+        data, next_show_time = venue_detail(venue_id)
+        all_data, _ = venue_detail(venue_id, show_all=True)
+    assert next_show_time == now + timedelta(days=1)
+    assert [show['start_time'] for show in data['upcoming_shows']] == \
+        [now + timedelta(days=1), now + timedelta(days=2)]
+    assert data['upcoming_shows_count'] == 3
+    assert len(all_data['upcoming_shows']) == 3
+    # Past shows come most recent first, and are all listed
+    assert [show['start_time'] for show in data['past_shows']] == \
+        [now - timedelta(days=1), now - timedelta(days=2)]
+    assert data['past_shows_count'] == 2
+
+
+def test_venue_without_shows(make_venue, client):
+    venue_id = make_venue()
+    with app.test_request_context():
+        data, next_show_time = venue_detail(venue_id)
+    assert data['past_shows'] == data['upcoming_shows'] == []
+    assert data['upcoming_shows_count'] == data['past_shows_count'] == 0
+    assert next_show_time is None
+    assert client.get(f'/venues/{venue_id + 1}').status_code == 404
@@ -0,0 +1,21 @@
+from datetime import datetime
+import babel.dates
+import pytest
+from models import format_datetime
+
+SHOW_TIME = datetime(2019, 5, 21, 21, 30)
+
+
+@pytest.mark.parametrize('format, pattern', [
+    ('full', "EEEE MMMM, d, y 'at' h:mma"),
+    ('medium', 'EE MM, dd, y h:mma'),
+    ('yyyy-MM-dd', 'yyyy-MM-dd'),
+])
+def test_format_datetime_matches_babel(format, pattern):
+    assert format_datetime(SHOW_TIME, format) == \
+        babel.dates.format_datetime(SHOW_TIME, pattern, locale=babel.dates.LC_TIME)
+
+
+def test_format_datetime_parses_strings():
+    assert format_datetime('2019-05-21T21:30:00.000Z', 'full') == \
+        format_datetime(SHOW_TIME, 'full') == 'Tuesday May, 21, 2019 at 9:30PM'
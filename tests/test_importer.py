@@ -0,0 +1,148 @@
+import io
+from datetime import datetime
+import pytest
+from models import db, Venue, Artist, Shows
+from importer import (IMPORTS, ImportResult, InvalidRecord, read_records,
+                      _prepare, bulk_import)
+
+
+def prepare(entity, records):
+    model, columns, required = IMPORTS[entity]
+    result = ImportResult()
+    rows = _prepare(list(records), columns, required, result)
+    return rows, result.rejected
+
+
+def test_read_csv_records():
+    stream = io.StringIO('name,city,genres\nThe Musical Hop,San Francisco,"Jazz,Folk"\n'
+                         'Park Square,New York,Jazz\n')
+    records = list(read_records(stream, 'csv'))
+    assert records == [
+        (2, {'name': 'The Musical Hop', 'city': 'San Francisco', 'genres': 'Jazz,Folk'}),
+        (3, {'name': 'Park Square', 'city': 'New York', 'genres': 'Jazz'}),
+    ]
+
+
+def test_read_ndjson_records():
+    stream = io.StringIO('{"artist_id": 1, "venue_id": 2}\n\n{"artist_id": 3,\n'
+                         '[1, 2]\n{"venue_id": 4}\n')
+    records = list(read_records(stream, 'ndjson'))
+    assert [number for number, _ in records] == [1, 3, 4, 5]
+    assert records[0][1] == {'artist_id': 1, 'venue_id': 2}
+    assert isinstance(records[1][1], InvalidRecord)
+    assert records[1][1].reason.startswith('invalid JSON')
+    assert isinstance(records[2][1], InvalidRecord)
+    assert records[2][1].reason == 'not a JSON object'
+    assert records[3][1] == {'venue_id': 4}
+
+
+def test_prepare_shows():
+    rows, rejected = prepare('shows', [
+        (1, {'artist_id': '1', 'venue_id': '2', 'start_time': '2021-06-01 20:00'}),
+        (2, {'artist_id': 1, 'venue_id': 2, 'start_time': '2021-06-01T22:00:00',
+             'duration': 90}),
+        (3, {'artist_id': 1, 'start_time': '2021-06-01 20:00'}),
+        (4, {'artist_id': 'one', 'venue_id': 2, 'start_time': '2021-06-01 20:00'}),
+        (5, {'artist_id': 1, 'venue_id': 2, 'start_time': 'not a date'}),
+        (6, {'artist_id': 1, 'venue_id': 2, 'start_time': '2021-06-01', 'duration': 0}),
+        (7, {'artist_id': 1, 'venue_id': 2 ** 31, 'start_time': '2021-06-01'}),
+        (8, InvalidRecord('not a JSON object')),
+    ])
+    assert rows == [
+        (1, [1, 2, '2021-06-01T20:00:00', 120]),
+        (2, [1, 2, '2021-06-01T22:00:00', 90]),
+    ]
+    assert [number for number, _ in rejected] == [3, 4, 5, 6, 7, 8]
+    assert rejected[0] == (3, 'missing venue_id')
+    assert rejected[-1] == (8, 'not a JSON object')
+
+
+def test_prepare_venues():
+    rows, rejected = prepare('venues', [
+        (2, {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+             'address': '1015 Folsom Street', 'phone': '123-123-1234',
+             'genres': 'Jazz, Folk', 'seeking_talent': 'yes'}),
+        (3, {'name': 'Park Square', 'city': 'New York', 'state': 'NY',
+             'address': '34 Whiskey Moore Ave', 'phone': '415-000-1234',
+             'genres': [1, 2]}),
+    ])
+    assert len(rows) == 1
+    number, row = rows[0]
+    assert row[5] == '{"Jazz","Folk"}'
+    assert row[9] == 't'
+    # genre_mask, computed since COPY skips the mapper events
+    assert row[-1] != 0
+    assert [number for number, _ in rejected] == [3]
+
+
+def test_bulk_import_rejects_and_loads(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    stream = io.StringIO(
+        f'{{"artist_id": {artist_id}, "venue_id": {venue_id}, "start_time": "2021-06-01 20:00"}}\n'
+        f'{{"artist_id": {artist_id}, "venue_id": {venue_id + 1}, "start_time": "2021-06-02 20:00"}}\n'
+        'not json\n')
+    result, changed = bulk_import('shows', read_records(stream, 'ndjson'))
+    assert result.imported == 1
+    rejected = dict(result.rejected)
+    assert rejected[2] == f'unknown venue {venue_id + 1}'
+    assert rejected[3].startswith('invalid JSON')
+    assert len(rejected) == 2
+    assert changed == {Venue: {venue_id}, Artist: {artist_id}}
+    assert db.session.query(Shows).count() == 1
+
+
+def test_bulk_import_dry_run(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    records = iter([(1, {'artist_id': artist_id, 'venue_id': venue_id,
+                         'start_time': '2021-06-01 20:00'})])
+    result, _ = bulk_import('shows', records, dry_run=True)
+    assert result.imported == 1
+    assert db.session.query(Shows).count() == 0
+
+
+@pytest.mark.parametrize('format', ['csv', 'ndjson'])
+def test_read_records_of_an_empty_file(format):
+    assert list(read_records(io.StringIO(''), format)) == []
+
+
+def test_bulk_import_rejects_double_bookings(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    # Stored in the October partition, running into November
+    db.session.add(Shows(venue_id=venue_id, artist_id=artist_id,
+                         start_time=datetime(2026, 10, 31, 23, 0), duration=120))
+    db.session.commit()
+    show = {'artist_id': artist_id, 'venue_id': venue_id}
+    records = iter([
+        # In the November partition, whose constraint cannot see October
+        (1, dict(show, start_time='2026-11-01 00:30')),
+        (2, dict(show, start_time='2026-11-01 01:00', duration=60)),
+        # Overlapping line 2, copied with the batch before
+        (3, dict(show, start_time='2026-11-01 01:30', duration=60)),
+        (4, dict(show, start_time='2026-11-01 02:00', duration=60)),
+    ])
+    result, _ = bulk_import('shows', records, batch_size=2)
+    assert result.imported == 2
+    assert result.rejected == [(1, f'venue {venue_id} is already booked (show 1)'),
+                               (3, f'venue {venue_id} is already booked (show 2)')]
+    assert db.session.query(Shows).count() == 3
+
+
+def test_bulk_import_rejects_overlaps_within_a_batch(make_venue, make_artist):
+    venue_id, artist_id = make_venue(), make_artist()
+    show = {'artist_id': artist_id, 'venue_id': venue_id}
+    records = iter([
+        (1, dict(show, start_time='2026-11-01 00:30')),
+        (2, dict(show, start_time='2026-10-31 23:00')),
+        (3, dict(show, venue_id=make_venue(), start_time='2026-10-31 23:00')),
+    ])
+    result, _ = bulk_import('shows', records)
+    assert result.imported == 2
+    assert result.rejected == [(1, f'venue {venue_id} is booked by line 2')]
+
+
+def test_show_ids_come_from_the_sequence(database):
+    show = Shows(id=1, venue_id=1, artist_id=1)
+    db.session.add(show)
+    with pytest.raises(ValueError):
+        db.session.flush()
+    db.session.rollback()
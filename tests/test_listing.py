@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from models import app, db, Artist, Shows
+from queries import (listing_filters, artist_listing_query, facet_query,
+                     facet_links, venue_listing_query, venue_areas,
+                     VENUE_LISTING_ORDER)
+
+
+def listing(url):
+    with app.test_request_context(url):
+        filters = listing_filters()
+        names = sorted(row.name for row in artist_listing_query(filters))
+        facets = facet_links(facet_query(Artist, filters).all(), filters)
+    return names, facets
+
+
+def test_genre_filter_needs_every_genre(make_artist):
+    make_artist(name='Guns N Petals', genres=['Rock n Roll'])
+    make_artist(name='Matt Quevedo', genres=['Jazz'])
+    make_artist(name='The Wild Sax Band', genres=['Jazz', 'Classical'], state='NY',
+                city='New York')
+    assert listing('/artists?genre=Jazz')[0] == ['Matt Quevedo', 'The Wild Sax Band']
+    assert listing('/artists?genre=Jazz&genre=Classical')[0] == ['The Wild Sax Band']
+    assert listing('/artists?genre=Jazz&genre=Pop')[0] == []
+    # Unknown genres are ignored
+    assert len(listing('/artists?genre=Polka')[0]) == 3
+
+
+def test_facets_count_the_filtered_rows(make_artist):
+    make_artist(genres=['Rock n Roll'])
+    make_artist(genres=['Jazz'])
+    make_artist(genres=['Jazz', 'Classical'], state='NY', city='New York')
+    _, facets = listing('/artists?genre=Jazz')
+    assert {facet['name']: facet['count'] for facet in facets['genres']} == \
+        {'Jazz': 2, 'Classical': 1}
+    assert {facet['name']: facet['count'] for facet in facets['states']} == \
+        {'CA': 1, 'NY': 1}
+    assert facets['filtered']
+
+
+def test_streamed_shows_list_every_upcoming_show(make_venue, make_artist, client,
+                                                 monkeypatch):
+    venue_id = make_venue()
+    names = [f'Artist {number}' for number in range(5)]
+    now = datetime.now().replace(microsecond=0)
+    db.session.add_all(Shows(venue_id=venue_id, artist_id=make_artist(name=name),
+                             start_time=now + timedelta(days=day))
+                       for day, name in enumerate(reversed(names), 1))
+    db.session.add(Shows(venue_id=venue_id, artist_id=make_artist(name='Past'),
+                         start_time=now - timedelta(days=1)))
+    db.session.commit()
+    # Fetched two rows at a time, and not paginated
+    monkeypatch.setitem(app.config, 'STREAM_BATCH_SIZE', 2)
+    monkeypatch.setitem(app.config, 'PAGE_SIZE', 2)
+    response = client.get('/shows?stream=1')
+    assert response.is_streamed
+    page = response.get_data(as_text=True)
+    assert [name for name in names if name in page] == names
+    # Soonest first
+    assert page.index('Artist 4') < page.index('Artist 0')
+    assert 'Past' not in page
+
+
+def test_venues_are_grouped_by_area(make_venue):
+    make_venue(name='Park Square', city='New York', state='NY')
+    make_venue(name='The Musical Hop')
+    make_venue(name='The Dueling Pianos Bar', city='New York', state='NY')
+    # Same city name, another state
+    make_venue(name='Brooklyn Bowl', city='New York', state='IA')
+    with app.test_request_context('/venues'):
+        rows = venue_listing_query(listing_filters()).order_by(*VENUE_LISTING_ORDER).all()
+    areas = venue_areas(rows)
+    assert [(area['city'], area['state'], [venue['name'] for venue in area['venues']])
+            for area in areas] == [
+        ('New York', 'IA', ['Brooklyn Bowl']),
+        ('New York', 'NY', ['Park Square', 'The Dueling Pianos Bar']),
+        ('San Francisco', 'CA', ['The Musical Hop']),
+    ]
+    assert areas[0]['venues'][0]['num_upcoming_shows'] == 0
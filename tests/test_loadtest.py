@@ -0,0 +1,28 @@
+import pytest
+from loadtest import LatencyHistogram
+
+
+def test_percentiles_within_one_percent():
+    histogram = LatencyHistogram()
+    for millisecond in range(1, 1001):
+        histogram.record(millisecond / 1000)
+    assert histogram.total == 1000
+    for percent in (50, 90, 99):
+        assert histogram.percentile(percent) == pytest.approx(percent / 100, rel=0.01)
+    assert histogram.percentile(100) == 1.0
+
+
+def test_merge():
+    fast, slow = LatencyHistogram(), LatencyHistogram()
+    for _ in range(90):
+        fast.record(0.002)
+    for _ in range(10):
+        slow.record(1.5)
+    fast.merge(slow)
+    assert fast.total == 100
+    assert fast.percentile(90) == pytest.approx(0.002, rel=0.01)
+    assert fast.percentile(95) == 1.5
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().percentile(99) == 0.0
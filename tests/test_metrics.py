@@ -0,0 +1,38 @@
+import time
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from models import app, db
+from metrics import Histogram, Counter, start_request_metrics
+
+
+def test_histogram_exposition():
+    histogram = Histogram('latency_seconds', 'Latency.', ('endpoint',), [0.1, 1])
+    histogram.observe(0.05, 'venues')
+    histogram.observe(0.5, 'venues')
+    lines = histogram.exposition()
+    assert 'latency_seconds_bucket{endpoint="venues",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{endpoint="venues",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{endpoint="venues",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{endpoint="venues"} 2' in lines
+
+
+def test_counter_escapes_labels():
+    counter = Counter('requests_total', 'Requests.', ('path',))
+    counter.inc(2, 'say "hi"')
+    assert counter.exposition()[-1] == 'requests_total{path="say \\"hi\\""} 2.0'
+
+
+def test_failed_statements_do_not_skew_timings(database):
+    with app.test_request_context():
+        start_request_metrics()
+        with db.engine.connect() as connection:
+            with pytest.raises(ProgrammingError):
+                connection.execute(text('SELECT * FROM no_such_table'))
+            # Time outside of any statement, which a start time left
+            # over by the failed one would count
+            time.sleep(0.3)
+            connection.execute(text('SELECT pg_sleep(0.05)'))
+        assert g.sql_statements == 1
+        assert 0.05 <= g.db_time < 0.3
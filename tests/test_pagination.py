@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime, timezone
+import pytest
+from models import app, Venue, Artist, Shows
+from pagination import encode_cursor, decode_cursor
+
+SHOW_ORDER = (Shows.start_time, Shows.id)
+VENUE_ORDER = (Venue.city, Venue.state, Venue.name, Venue.id)
+
+
+def token(values):
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    key = [datetime(2021, 6, 1, 20, 30), 42]
+    assert decode_cursor(encode_cursor(key), SHOW_ORDER) == key
+    key = ['San Francisco', 'CA', 'The Musical Hop', 1]
+    assert decode_cursor(encode_cursor(key), VENUE_ORDER) == key
+
+
+def test_no_cursor():
+    assert decode_cursor(None, SHOW_ORDER) is None
+    assert decode_cursor('', SHOW_ORDER) is None
+
+
+@pytest.mark.parametrize('value', [
+    'not base64 %%%',
+    base64.urlsafe_b64encode(b'not json').decode(),
+    token({'a': 1}),
+    token([1]),
+    token([1, 2, 3]),
+    token(['a', 1]),
+    token([{'dt': 5}, 1]),
+    token([{'dt': 'yesterday'}, 1]),
+    token([{'dt': '2021-06-01T20:30:00'}, '1']),
+    token([{'dt': '2021-06-01T20:30:00'}, 1.5]),
+    token([{'dt': '2021-06-01T20:30:00'}, True]),
+    token([{'dt': '2021-06-01T20:30:00'}, 2 ** 31]),
+    token([{'dt': datetime(2021, 6, 1, tzinfo=timezone.utc).isoformat()}, 1]),
+])
+def test_invalid_show_cursor(value):
+    with pytest.raises(ValueError):
+        decode_cursor(value, SHOW_ORDER)
+
+
+def test_invalid_venue_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor(token(['San Francisco', 'CA', None, 1]), VENUE_ORDER)
+    with pytest.raises(ValueError):
+        decode_cursor(token(['San\x00Francisco', 'CA', 'Hop', 1]), VENUE_ORDER)
+
+
+@pytest.mark.parametrize('url', [
+    '/shows?after=' + token(['a', 1]),
+    '/venues?before=' + token([1, 2, 3, 4]),
+    '/artists?after=' + token(['Guns N Petals']),
+])
+def test_invalid_cursor_is_a_bad_request(url):
+    # Rejected before any query runs
+    assert app.test_client().get(url).status_code == 400
+
+
+def test_invalid_cursor_in_the_api():
+    response = app.test_client().get('/api/v1/artists?after=' + token([1, 'a']))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid page cursor'}
+
+
+def test_artist_order_cursor():
+    key = decode_cursor(encode_cursor(['Guns N Petals', 4]), (Artist.name, Artist.id))
+    assert key == ['Guns N Petals', 4]
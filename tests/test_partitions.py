@@ -0,0 +1,17 @@
+from datetime import datetime
+from models import db, Shows
+from partitions import (empty_partitions, create_partitions, partition_name,
+                        month_start, next_month)
+
+
+def test_empty_partitions(make_venue, make_artist):
+    this_month = month_start(datetime.now())
+    month = next_month(this_month)
+    create_partitions(db.session.connection(), this_month, month)
+    db.session.add(Shows(venue_id=make_venue(), artist_id=make_artist(),
+                         start_time=month.replace(hour=20)))
+    db.session.commit()
+    # Filled since the last ANALYZE, so pg_class still counts no rows
+    empty = empty_partitions(db.session)
+    assert partition_name(month) not in empty
+    assert partition_name(this_month) in empty
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from pool import TimedQueuePool, pool_stats
+
+
+def test_pool_stats_count_checkouts_and_timeouts(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=TimedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    connection = engine.connect()
+    stats = pool_stats(engine)
+    assert stats['class'] == 'TimedQueuePool'
+    assert (stats['size'], stats['checked_out'], stats['checkouts']) == (1, 1, 1)
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    connection.close()
+    stats = pool_stats(engine)
+    assert (stats['checked_in'], stats['checked_out']) == (1, 0)
+    assert (stats['checkouts'], stats['timeouts']) == (2, 1)
+    # The timed out checkout waited for pool_timeout
+    assert stats['max_wait_time'] >= 0.05
+    assert stats['avg_wait_time'] == pytest.approx(stats['wait_time'] / 2, abs=1e-6)
+
+
+def test_db_stats(client):
+    stats = client.get('/stats/db').get_json()
+    assert stats['primary']['checkouts'] >= 1
@@ -0,0 +1,41 @@
+import logging
+from models import app, db, Venue
+from querycheck import normalize, _start_query_check, _report_queries
+
+
+def test_normalize():
+    assert normalize('SELECT * FROM "Venue" WHERE id = %(id_1)s AND name = \'Hop\'') == \
+        normalize('SELECT *\n FROM "Venue"\n WHERE id = 42 AND name = \'It\'\'s\'') == \
+        'SELECT * FROM "Venue" WHERE id = ? AND name = ?'
+    assert normalize('SELECT id FROM shows_2026_10 WHERE id IN (%s, %s, %s)') == \
+        'SELECT id FROM shows_2026_10 WHERE id IN (?)'
+    assert normalize('INSERT INTO t VALUES (%s, %s), (%s, %s)') == \
+        'INSERT INTO t VALUES (?)'
+
+
+def test_repeated_queries_are_reported(make_venue, caplog, monkeypatch):
+    venue_ids = [make_venue() for _ in range(3)]
+    monkeypatch.setitem(app.config, 'QUERY_REPEAT_THRESHOLD', 3)
+    monkeypatch.setitem(app.config, 'QUERY_BUDGETS', {})
+    monkeypatch.setitem(app.config, 'QUERY_BUDGET', 2)
+    with app.test_request_context('/venues'), caplog.at_level(logging.WARNING):
+        _start_query_check()
+        for venue_id in venue_ids:
+            db.session.query(Venue.name).filter(Venue.id == venue_id).one()
+        _report_queries()
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].startswith('Possible N+1 in GET venues: the same query ran 3 times '
+                                  'from tests/test_querycheck.py:')
+    assert messages[1].startswith('Query budget exceeded in GET venues: 3 queries '
+                                  'for a budget of 2')
+
+
+def test_distinct_queries_are_not_reported(make_venue, caplog):
+    venue_id = make_venue()
+    with app.test_request_context('/venues'), caplog.at_level(logging.WARNING):
+        _start_query_check()
+        db.session.query(Venue.name).filter(Venue.id == venue_id).one()
+        db.session.query(Venue.city).filter(Venue.id == venue_id).one()
+        _report_queries()
+    assert caplog.records == []
@@ -0,0 +1,26 @@
+from flask import g
+from models import app
+from routing import reads_replica
+from app import search_cache
+
+
+def test_reads_replica():
+    assert not reads_replica()
+    with app.test_request_context():
+        g.db_bind = None
+        assert not reads_replica()
+        g.db_bind = 'replica_0'
+        assert reads_replica()
+
+
+def test_replica_reads_are_not_cached(database, monkeypatch):
+    # Run the search on the primary, as if routed to a replica
+    monkeypatch.setattr('app.reads_replica', lambda: True)
+    search_cache.clear()
+    client = app.test_client()
+    assert client.post('/venues/search', data={'search_term': 'Hop'}).status_code == 200
+    assert search_cache.get(('Venue', 'hop')) is None
+
+    monkeypatch.setattr('app.reads_replica', lambda: False)
+    client.post('/venues/search', data={'search_term': 'Hop'})
+    assert search_cache.get(('Venue', 'hop')) is not None
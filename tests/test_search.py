@@ -0,0 +1,39 @@
+from models import db, Venue
+from app import search_cache
+
+
+def search(client, entity, term):
+    response = client.post(f'/{entity}/search', data={'search_term': term})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_search_is_case_insensitive(make_venue, client):
+    make_venue(name='The Musical Hop')
+    make_venue(name='Park Square Live Music & Coffee')
+    make_venue(name='The Dueling Pianos Bar')
+    page = search(client, 'venues', 'music')
+    assert 'The Musical Hop' in page and 'Park Square Live Music' in page
+    assert 'Dueling' not in page
+    assert 'The Musical Hop' in search(client, 'venues', 'HOP')
+
+
+def test_search_wildcards_are_literal(make_venue, make_artist, client):
+    make_venue(name='The Musical Hop')
+    make_artist(name='100% Jazz')
+    assert 'Musical Hop' not in search(client, 'venues', '%')
+    assert 'Musical Hop' not in search(client, 'venues', 'Musical_Hop')
+    assert '100% Jazz' in search(client, 'artists', '0% j')
+
+
+def test_search_cache_is_invalidated_by_writes(make_venue, client):
+    search_cache.clear()
+    venue_id = make_venue(name='The Musical Hop')
+    assert 'The Musical Hop' in search(client, 'venues', 'hop')
+    hits = search_cache.hits
+    # Same normalized term: served from the cache
+    assert 'The Musical Hop' in search(client, 'venues', ' Hop ')
+    assert search_cache.hits == hits + 1
+    Venue.query.get(venue_id).name = 'The Dueling Pianos Bar'
+    db.session.commit()
+    assert 'The Musical Hop' not in search(client, 'venues', 'hop')